@@ -0,0 +1,191 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+import uuid
+
+import click
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from webservice import nexmo_async
+from webservice.speedups import JSON_ENCODERS, install_uvloop
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+
+PHONE_NUMBERS = [
+    {"name": "Mariatta", "phone": "16040001234"},
+    {"name": "Miss Islington", "phone": "17782223333"},
+]
+
+
+def stub_nexmo():
+    """Return an app answering the Nexmo API calls made by the webhooks"""
+
+    async def create_call(request):
+        return web.json_response({"uuid": str(uuid.uuid4()), "status": "started"})
+
+    async def update_call(request):
+        return web.Response(status=204)
+
+    async def send_speech(request):
+        return web.json_response({"message": "Talk started"})
+
+    app = web.Application()
+    app.router.add_post("/v1/calls", create_call)
+    app.router.add_put("/v1/calls/{uuid}", update_call)
+    app.router.add_put("/v1/calls/{uuid}/talk", send_speech)
+    return app
+
+
+def get_private_key():
+    """Return a new private key, for the client to sign its API calls with"""
+    key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend()
+    )
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+async def measure(client, paths, concurrency):
+    """Request the paths, concurrency at a time. Return the requests per second
+
+    The time includes the background tasks the requests started, e.g. hanging
+    up the other staff calls, so all the work of the webhooks is measured.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    background_tasks = client.server.app["background_tasks"]
+
+    async def get(path):
+        async with semaphore:
+            async with client.get(path) as resp:
+                assert resp.status == 200, await resp.text()
+                await resp.read()
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[get(path) for path in paths])
+    while background_tasks:
+        await asyncio.gather(*background_tasks)
+    return len(paths) / (time.perf_counter() - started_at)
+
+
+async def run_round(client, requests, concurrency):
+    """Return the requests per second of the answer webhooks, by webhook"""
+    calls = [(str(uuid.uuid4()), str(uuid.uuid4())) for _ in range(requests)]
+    answer_call = await measure(
+        client,
+        [
+            f"/webhook/answer/?conversation_uuid={conversation_uuid}"
+            f"&uuid={call_uuid}&to=1800123456&from=Restricted"
+            for conversation_uuid, call_uuid in calls
+        ],
+        concurrency,
+    )
+    answer_conference_call = await measure(
+        client,
+        [
+            f"/webhook/answer_conference_call/{conversation_uuid}/{call_uuid}/"
+            f"?uuid={uuid.uuid4()}&to=16040001234&from=1800123456"
+            for conversation_uuid, call_uuid in calls
+        ],
+        concurrency,
+    )
+    return {
+        "answer_call": answer_call,
+        "answer_conference_call": answer_conference_call,
+    }
+
+
+async def run(requests, concurrency, warmup, rounds):
+    """Return the requests per second of each measured round, by webhook"""
+    from webservice.__main__ import create_app
+
+    nexmo = TestServer(stub_nexmo())
+    await nexmo.start_server()
+    nexmo_async.API_URL = nexmo_async.REST_URL = str(nexmo.make_url("")).rstrip("/")
+    client = TestClient(TestServer(create_app()))
+    await client.start_server()
+
+    results = {}
+    try:
+        for _ in range(warmup):
+            await run_round(client, requests, concurrency)
+        for _ in range(rounds):
+            round_results = await run_round(client, requests, concurrency)
+            for webhook, result in round_results.items():
+                results.setdefault(webhook, []).append(result)
+    finally:
+        await client.close()
+        await nexmo.close()
+    return results
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "--requests", default=1000, show_default=True, help="Requests per webhook."
+)
+@click.option(
+    "--concurrency", default=10, show_default=True, help="Requests at the same time."
+)
+@click.option(
+    "--warmup", default=2, show_default=True, help="Rounds run before measuring."
+)
+@click.option("--rounds", default=5, show_default=True, help="Rounds measured.")
+@click.option(
+    "--loop",
+    type=click.Choice(["asyncio", "uvloop"]),
+    default="asyncio",
+    show_default=True,
+    help="Event loop to run on.",
+)
+@click.option(
+    "--json",
+    "json_encoder",
+    type=click.Choice(JSON_ENCODERS),
+    default="json",
+    show_default=True,
+    help="JSON encoder of the responses.",
+)
+def main(requests, concurrency, warmup, rounds, loop, json_encoder):
+    """Measure the requests per second of the webhooks answering the calls.
+
+    The webservice runs in this process, against a stub of the Nexmo API, to
+    compare the event loops and JSON encoders. Each round sends the requests
+    to each webhook, the median of the measured rounds is reported.
+    """
+    if loop == "uvloop" and not install_uvloop():
+        loop = "asyncio"
+    os.environ.update(
+        NEXMO_API_KEY="apikey",
+        NEXMO_API_SECRET="secret",
+        NEXMO_APP_ID="app_id",
+        NEXMO_PRIVATE_KEY_VOICE_APP=get_private_key(),
+        HOTLINE_DESC="Benchmark Hotline",
+        PHONE_NUMBERS=json.dumps(PHONE_NUMBERS),
+        JSON_ENCODER=json_encoder,
+    )
+
+    # The webhooks print about each call.
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.get_event_loop().run_until_complete(
+            run(requests, concurrency, warmup, rounds)
+        )
+
+    click.echo(f"loop: {loop}, json: {json_encoder}")
+    for webhook, rounds_results in results.items():
+        median = statistics.median(rounds_results)
+        spread = f"{min(rounds_results):.0f}-{max(rounds_results):.0f}"
+        click.echo(f"{webhook}: {median:.0f} requests/s (median, rounds: {spread})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,30 @@
+import hashlib
+import itertools
+import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
 
 import click
-import nexmo
+import requests
+
+from download_recording.manifest import Manifest
+from webservice import nexmo_client
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
+# Size of the chunks recordings are written in.
+CHUNK_SIZE = 64 * 1024
+
+RECORDINGS_DIR = "./recordings"
+
+MANIFEST_PATH = "./recordings/manifest.sqlite3"
+
+_local = threading.local()
+
 
 def get_nexmo_client():
     """Return an instance of Nexmo client library"""
@@ -19,31 +38,376 @@ def get_nexmo_client():
         click.echo("Missing NEXMO_PRIVATE_KEY_VOICE_APP environment variable.")
         sys.exit(-1)
 
-    client = nexmo.Client(application_id=app_id, private_key=private_key)
+    client = nexmo_client.Client(application_id=app_id, private_key=private_key)
     return client
 
 
-@click.command(context_settings=CONTEXT_SETTINGS)
+def get_session():
+    """Return the requests session of the current thread.
+
+    Each thread keeps its connections to Nexmo alive between downloads.
+    """
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def recording_uuid(url):
+    """Return the UUID of the recording at url"""
+    return url.split("/")[-1]
+
+
+def recording_path(url, directory=RECORDINGS_DIR):
+    """Return where to save the recording at url"""
+    return os.path.join(directory, f"{recording_uuid(url)}.mp3")
+
+
+def read_recordings(lines, progress=None):
+    """Yield the URL and metadata of each recording listed in lines.
+
+    A line is either a URL, or a JSON object with a "recording_url" (or "url")
+    key, like the recording events sent by Nexmo. The metadata is that object,
+    or an empty dict. Blank lines are skipped, invalid ones are reported and
+    counted as failed in progress.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith("{"):
+            yield line, {}
+            continue
+        try:
+            metadata = json.loads(line)
+            url = metadata.get("recording_url") or metadata["url"]
+        except (ValueError, KeyError):
+            if progress is not None:
+                progress.failed += 1
+            click.echo(f"Invalid recording on line {number}: {line}", err=True)
+            continue
+        yield url, metadata
+
+
+def format_size(size):
+    """Return the size in bytes in a human readable form, e.g: 1.5 MB"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000 or unit == "GB":
+            break
+        size /= 1000
+    return f"{size:.1f} {unit}"
+
+
+class Progress:
+    """Statistics of the downloads, updated by the download threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.downloaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.size = 0
+
+    def add(self, size):
+        with self.lock:
+            self.size += size
+
+    def rate(self):
+        """Return the aggregate throughput, e.g: 1.5 MB/s"""
+        elapsed = max(time.monotonic() - self.start, 0.001)
+        return f"{format_size(self.size / elapsed)}/s"
+
+
+def file_checksum(path):
+    """Return the SHA-256 checksum of the file"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def download(client, url, metadata, progress, checksum=False):
+    """Download the recording.
+
+    Return its path, the number of bytes downloaded, or None if it was already
+    downloaded, the download time and, if checksum is true, the SHA-256
+    checksum of the recording. A "sha256" in metadata is the checksum of the
+    recording already downloaded, it isn't computed again if it's up to date.
+    """
+    start = time.monotonic()
+    sizes = []
+    up_to_date = os.path.exists(recording_path(url))
+
+    def on_chunk(size):
+        nonlocal up_to_date
+        up_to_date = False
+        sizes.append(size)
+        progress.add(size)
+
+    path = fetch_recording(client, url, size=metadata.get("size"), on_chunk=on_chunk)
+    elapsed = time.monotonic() - start
+    if not checksum:
+        sha256 = None
+    elif up_to_date and "sha256" in metadata:
+        sha256 = metadata["sha256"]
+    else:
+        sha256 = file_checksum(path)
+    return path, None if up_to_date else sum(sizes), elapsed, sha256
+
+
+def fetch_recording(client, url, directory=RECORDINGS_DIR, size=None, on_chunk=None):
+    """Download the recording at url, return its path.
+
+    The recording is streamed to a .part file, which is renamed once the
+    download is complete. A partial download left by a previous run is resumed,
+    or started over if it's larger than the recording.
+    If the recording was already downloaded, and has the same size as the one
+    on Nexmo, it isn't downloaded again. The size is asked to Nexmo, unless it
+    is given.
+
+    on_chunk is called with the size of each chunk downloaded.
+    """
+    session = get_session()
+    host = urlparse(url).hostname
+    path = recording_path(url, directory)
+    part_path = f"{path}.part"
+    os.makedirs(directory, exist_ok=True)
+
+    def headers(**kwargs):
+        token = client.generate_application_jwt()
+        return dict(client.headers, Authorization=b"Bearer " + token, **kwargs)
+
+    def remote_size():
+        if size is not None:
+            return size
+        response = session.head(url, headers=headers())
+        if not response.ok:
+            client.parse(host, response)
+        return response.headers.get("Content-Length")
+
+    if os.path.exists(path):
+        size = remote_size()
+        if str(size) == str(os.path.getsize(path)):
+            return path
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    range_headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with session.get(url, headers=headers(**range_headers), stream=True) as response:
+        if response.status_code == 416:
+            # The range starts at the end of the recording, or after it.
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if not total.isdigit():
+                total = remote_size()
+            if str(total) == str(offset):
+                # The previous run downloaded everything, but didn't rename it.
+                os.replace(part_path, path)
+                return path
+            os.remove(part_path)
+            return fetch_recording(client, url, directory, size, on_chunk)
+        if not response.ok:
+            client.parse(host, response)
+
+        # If the range was ignored, the whole recording is downloaded again.
+        mode = "ab" if response.status_code == 206 else "wb"
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                if on_chunk is not None:
+                    on_chunk(len(chunk))
+
+    os.replace(part_path, path)
+    return path
+
+
+def run_downloads(
+    client, recordings, jobs, checksum=False, on_downloaded=None, progress=None
+):
+    """Download the recordings, jobs at a time, and report the progress.
+
+    recordings is an iterable of URL and metadata pairs, it is consumed as the
+    downloads progress. on_downloaded is called with the URL, path and checksum
+    of each recording downloaded, or found already up to date.
+
+    Return the Progress of the downloads, progress if it's given.
+    """
+    if progress is None:
+        progress = Progress()
+    pending = {}
+
+    def report(done):
+        for future in done:
+            url = pending.pop(future)
+            try:
+                path, size, elapsed, sha256 = future.result()
+            except Exception as e:
+                progress.failed += 1
+                click.echo(f"Failed to download {url}: {e}", err=True)
+                continue
+            if size is None:
+                progress.skipped += 1
+            else:
+                progress.downloaded += 1
+                rate = format_size(size / max(elapsed, 0.001))
+                click.echo(
+                    f"Downloaded {url} to {path}: {format_size(size)} "
+                    f"in {elapsed:.1f}s ({rate}/s). "
+                    f"{progress.downloaded} done ({progress.rate()})"
+                )
+            if on_downloaded is not None:
+                on_downloaded(url, path, sha256)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for url, metadata in recordings:
+            # Don't read ahead of the downloads too much.
+            if len(pending) >= jobs * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                report(done)
+            future = executor.submit(
+                download, client, url, metadata, progress, checksum
+            )
+            pending[future] = url
+        report(wait(pending).done)
+
+    elapsed = time.monotonic() - progress.start
+    click.echo(
+        f"Downloaded {progress.downloaded} recordings, {format_size(progress.size)} "
+        f"in {elapsed:.1f}s ({progress.rate()}), {progress.failed} failed."
+    )
+    click.echo(f"Skipped {progress.skipped} recordings already up to date.")
+    return progress
+
+
+class CLI(click.Group):
+    """Runs the download command, unless another command is given"""
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands and args[0] not in ("-h", "--help"):
+            args = ["download"] + args
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=CLI, context_settings=CONTEXT_SETTINGS)
+def cli():
+    """Download the recordings off Nexmo"""
+
+
+jobs_option = click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of recordings to download at the same time.",
+)
+
+
+@cli.command("download", context_settings=CONTEXT_SETTINGS)
+@jobs_option
+@click.option(
+    "-f",
+    "--from-file",
+    type=click.File("r"),
+    help="Read the recording URLs from this file, - for stdin. "
+    "One URL, or JSON object with a recording_url, per line.",
+)
 @click.argument("urls", nargs=-1)
-def download_recording(urls):
+def download_recording(jobs, from_file, urls):
     """Download the recordings off Nexmo
 
     From the enhanced-coc-hotline, type in command line:
 
        $ python3 -m download_recording url1 url2 url3 ...
 
+    Or, to read the URLs from a file, or from another command:
+
+       $ list_recordings | python3 -m download_recording --from-file -
+
+    Interrupted downloads are resumed, and recordings already downloaded are
+    skipped, so the command can be run again after a failure.
     """
 
     client = get_nexmo_client()
-    for url in urls:
-        recording = client.get_recording(url)
-        uuid = url.split("/")[-1]
+    progress = Progress()
+    recordings = ((url, {}) for url in urls)
+    if from_file is not None:
+        # Lines are read as they arrive, downloads start before the input ends.
+        recordings = itertools.chain(recordings, read_recordings(from_file, progress))
+
+    run_downloads(client, recordings, jobs, progress=progress)
+    if progress.failed:
+        sys.exit(1)
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@jobs_option
+@click.option(
+    "-f",
+    "--from-file",
+    type=click.File("r"),
+    default="-",
+    help="Read the list of recordings from this file, stdin by default. "
+    "One URL, or recording event JSON object, per line.",
+)
+@click.option(
+    "--manifest",
+    "manifest_path",
+    default=MANIFEST_PATH,
+    show_default=True,
+    help="Where to keep track of the recordings downloaded.",
+)
+def sync(jobs, from_file, manifest_path):
+    """Download the recordings which are new or changed since the last sync.
+
+    The recordings downloaded, their size and checksum, are kept in a manifest.
+    A recording in the manifest is only downloaded again if its size changed,
+    or if the file doesn't match the checksum anymore, e.g. it was corrupted:
+
+       $ cat recording_events.jsonl | python3 -m download_recording sync --jobs 8
+    """
+
+    client = get_nexmo_client()
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    manifest = Manifest(manifest_path)
+    progress = Progress()
+
+    def changed(recordings):
+        for url, metadata in recordings:
+            known = manifest.get(recording_uuid(url))
+            path = recording_path(url)
+            if known is not None and os.path.exists(path):
+                size, sha256 = known
+                if os.path.getsize(path) != size or file_checksum(path) != sha256:
+                    # Not the recording downloaded, download it again.
+                    os.remove(path)
+                elif metadata.get("size") is not None and int(metadata["size"]) == size:
+                    progress.skipped += 1
+                    continue
+                else:
+                    # Not computed again if the recording is up to date.
+                    metadata = dict(metadata, sha256=sha256)
+            # Without a size to compare with, fetch_recording asks Nexmo.
+            yield url, metadata
+
+    def on_downloaded(url, path, sha256):
+        size = os.path.getsize(path)
+        if manifest.get(recording_uuid(url)) != (size, sha256):
+            manifest.add(recording_uuid(url), url, size, sha256)
+
+    try:
+        run_downloads(
+            client,
+            changed(read_recordings(from_file, progress)),
+            jobs,
+            checksum=True,
+            on_downloaded=on_downloaded,
+            progress=progress,
+        )
+    finally:
+        manifest.close()
 
-        recordingfile = f"./recordings/{uuid}.mp3"
-        os.makedirs(os.path.dirname(recordingfile), exist_ok=True)
-        with open(recordingfile, "wb") as f:
-            f.write(recording)
+    if progress.failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    download_recording()
+    cli()
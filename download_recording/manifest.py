@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+
+class Manifest:
+    """The recordings downloaded so far, kept in a SQLite database.
+
+    Records the size and SHA-256 checksum of each recording, by recording UUID.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS recordings (
+                    uuid TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    downloaded_at REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, uuid):
+        """Return the size and checksum of the recording, or None if it's unknown"""
+        return self.db.execute(
+            "SELECT size, sha256 FROM recordings WHERE uuid = ?", (uuid,)
+        ).fetchone()
+
+    def add(self, uuid, url, size, sha256):
+        """Record that the recording was downloaded"""
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?)",
+                (uuid, url, size, sha256, time.time()),
+            )
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import uuid
+
+import pytest
+from aiohttp import web
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from webservice import nexmo_async
+
+
+class FakeNexmo:
+    """Stand-in for the Nexmo APIs, recording the requests it receives."""
+
+    def __init__(self):
+        self.calls_created = []
+        self.calls_updated = []
+        self.speech_sent = []
+        self.messages_sent = []
+        self.recordings = {}
+        self.recording_downloads = 0
+        # Status and body of the error returned when calling these phone numbers.
+        self.call_errors = {}
+        # Seconds before answering a request to call these phone numbers.
+        self.call_delays = {}
+        # Seconds to pause halfway through sending a whole recording.
+        self.recording_pause = 0
+
+        self.app = web.Application()
+        self.app.router.add_post("/v1/calls", self.create_call)
+        self.app.router.add_put("/v1/calls/{uuid}", self.update_call)
+        self.app.router.add_put("/v1/calls/{uuid}/talk", self.send_speech)
+        self.app.router.add_post("/sms/json", self.send_message)
+        self.app.router.add_get("/v1/files/{uuid}", self.get_recording)
+
+    def check_jwt(self, request):
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            raise web.HTTPUnauthorized()
+
+    async def create_call(self, request):
+        self.check_jwt(request)
+        params = await request.json()
+        number = params["to"][0]["number"]
+        await asyncio.sleep(self.call_delays.get(number, 0))
+        if number in self.call_errors:
+            status, body = self.call_errors[number]
+            return web.json_response(body, status=status)
+
+        self.calls_created.append(params)
+        return web.json_response(
+            {
+                "uuid": str(uuid.uuid4()),
+                "status": "started",
+                "direction": "outbound",
+                "conversation_uuid": f"CON-{uuid.uuid4()}",
+            },
+            status=201,
+        )
+
+    async def update_call(self, request):
+        self.check_jwt(request)
+        params = await request.json()
+        self.calls_updated.append(dict(params, uuid=request.match_info["uuid"]))
+        return web.Response(status=204)
+
+    async def send_speech(self, request):
+        self.check_jwt(request)
+        params = await request.json()
+        self.speech_sent.append(dict(params, uuid=request.match_info["uuid"]))
+        return web.json_response(
+            {"message": "Talk started", "uuid": request.match_info["uuid"]}
+        )
+
+    async def send_message(self, request):
+        params = dict(await request.post())
+        if not params.pop("api_key", None) or not params.pop("api_secret", None):
+            raise web.HTTPUnauthorized()
+
+        self.messages_sent.append(params)
+        return web.json_response(
+            {"message-count": "1", "messages": [{"to": params["to"], "status": "0"}]}
+        )
+
+    async def get_recording(self, request):
+        self.check_jwt(request)
+        self.recording_downloads += 1
+        try:
+            recording = self.recordings[request.match_info["uuid"]]
+        except KeyError:
+            raise web.HTTPNotFound()
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{hashlib.md5(recording).hexdigest()}"',
+        }
+        if request.headers.get("If-None-Match") == headers["ETag"]:
+            return web.Response(status=304, headers=headers)
+
+        if "Range" in request.headers:
+            start = request.http_range.start or 0
+            stop = min(request.http_range.stop or len(recording), len(recording))
+            if start >= len(recording):
+                headers["Content-Range"] = f"bytes */{len(recording)}"
+                return web.Response(status=416, headers=headers)
+
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{len(recording)}"
+            return web.Response(
+                status=206,
+                body=recording[start:stop],
+                headers=headers,
+                content_type="audio/mpeg",
+            )
+
+        if self.recording_pause:
+            response = web.StreamResponse(headers=headers)
+            response.content_type = "audio/mpeg"
+            response.content_length = len(recording)
+            await response.prepare(request)
+            half = len(recording) // 2
+            await response.write(recording[:half])
+            await asyncio.sleep(self.recording_pause)
+            await response.write(recording[half:])
+            await response.write_eof()
+            return response
+
+        return web.Response(body=recording, headers=headers, content_type="audio/mpeg")
+
+
+@pytest.fixture(scope="session")
+def private_key():
+    key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend()
+    )
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+@pytest.fixture
+def fake_nexmo(loop, aiohttp_server, monkeypatch):
+    fake_nexmo = FakeNexmo()
+    server = loop.run_until_complete(aiohttp_server(fake_nexmo.app))
+    fake_nexmo.url = str(server.make_url("")).rstrip("/")
+
+    monkeypatch.setattr(nexmo_async, "API_URL", fake_nexmo.url)
+    monkeypatch.setattr(nexmo_async, "REST_URL", fake_nexmo.url)
+    return fake_nexmo
@@ -0,0 +1,67 @@
+import asyncio
+
+from webservice.conversations import Conversations
+from webservice.state import MemoryState
+
+
+async def test_start():
+    conversations = Conversations(MemoryState(100), ttl=60)
+
+    conversation = await conversations.start("CON-123-456", "aaaa-bbbb")
+
+    assert conversation.origin_call_uuid == "aaaa-bbbb"
+    assert conversation.staff_calls == []
+    assert conversation.joined == []
+    again = await conversations.start("CON-123-456", "cccc-dddd")
+    assert again.origin_call_uuid == "aaaa-bbbb"
+    assert again.started_at == conversation.started_at
+    assert await conversations.get("CON-456-789") is None
+    assert await conversations.count() == 1
+
+
+async def test_add_staff_call():
+    conversations = Conversations(MemoryState(100), ttl=60)
+    conversation = await conversations.start("CON-123-456", "aaaa-bbbb")
+
+    await conversations.add_staff_call(conversation, "call-1")
+    await conversations.add_staff_call(conversation, "call-2")
+
+    assert conversation.staff_calls == ["call-1", "call-2"]
+    conversation = await conversations.get("CON-123-456")
+    assert conversation.staff_calls == ["call-1", "call-2"]
+
+
+async def test_join():
+    conversations = Conversations(MemoryState(100), ttl=60)
+    conversation = await conversations.start("CON-123-456", "aaaa-bbbb")
+
+    assert await conversations.join(conversation, "Mariatta") is True
+    conversation = await conversations.get("CON-123-456")
+    assert await conversations.join(conversation, "Miss Islington") is False
+
+    conversation = await conversations.get("CON-123-456")
+    assert conversation.joined == ["Mariatta", "Miss Islington"]
+    assert conversation.answered_at is not None
+
+
+async def test_expired_conversations_are_forgotten():
+    conversations = Conversations(MemoryState(100), ttl=0.01)
+    await conversations.start("CON-123-456", "aaaa-bbbb")
+
+    await asyncio.sleep(0.02)
+
+    assert await conversations.get("CON-123-456") is None
+
+
+async def test_changes_to_stale_conversations_are_kept():
+    conversations = Conversations(MemoryState(100), ttl=60)
+    dialing = await conversations.start("CON-123-456", "aaaa-bbbb")
+    joining = await conversations.get("CON-123-456")
+
+    assert await conversations.join(joining, "Mariatta") is True
+    await conversations.add_staff_call(dialing, "call-1")
+
+    conversation = await conversations.get("CON-123-456")
+    assert conversation.staff_calls == ["call-1"]
+    assert conversation.joined == ["Mariatta"]
+    assert conversation.answered_at is not None
@@ -0,0 +1,355 @@
+import asyncio
+import os
+
+import nexmo
+import pytest
+from click.testing import CliRunner
+
+import download_recording.__main__ as download_recording_main
+from download_recording.__main__ import (
+    Progress,
+    cli,
+    download_recording,
+    fetch_recording,
+    file_checksum,
+    format_size,
+    read_recordings,
+)
+from download_recording.manifest import Manifest
+from webservice import nexmo_client
+
+
+@pytest.fixture
+def client(private_key):
+    return nexmo_client.Client(application_id="app_id", private_key=private_key)
+
+
+async def fetch(client, url, directory):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, fetch_recording, client, url, directory)
+
+
+async def test_fetch_recording(client, fake_nexmo, tmp_path):
+    recording = os.urandom(200 * 1024)
+    fake_nexmo.recordings["aaaa-1111"] = recording
+
+    path = await fetch(client, f"{fake_nexmo.url}/v1/files/aaaa-1111", str(tmp_path))
+
+    assert path == str(tmp_path / "aaaa-1111.mp3")
+    assert open(path, "rb").read() == recording
+    assert os.listdir(str(tmp_path)) == ["aaaa-1111.mp3"]
+
+
+async def test_fetch_recording_resume(client, fake_nexmo, tmp_path):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    (tmp_path / "aaaa-1111.mp3.part").write_bytes(b"ID3 ")
+
+    path = await fetch(client, f"{fake_nexmo.url}/v1/files/aaaa-1111", str(tmp_path))
+
+    assert open(path, "rb").read() == b"ID3 recording"
+    assert os.listdir(str(tmp_path)) == ["aaaa-1111.mp3"]
+
+
+async def test_fetch_recording_resume_complete(client, fake_nexmo, tmp_path):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    (tmp_path / "aaaa-1111.mp3.part").write_bytes(b"ID3 recording")
+
+    path = await fetch(client, f"{fake_nexmo.url}/v1/files/aaaa-1111", str(tmp_path))
+
+    assert open(path, "rb").read() == b"ID3 recording"
+    assert os.listdir(str(tmp_path)) == ["aaaa-1111.mp3"]
+
+
+async def test_fetch_recording_resume_oversized(client, fake_nexmo, tmp_path):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    (tmp_path / "aaaa-1111.mp3.part").write_bytes(b"ID3 recording and more")
+
+    path = await fetch(client, f"{fake_nexmo.url}/v1/files/aaaa-1111", str(tmp_path))
+
+    assert open(path, "rb").read() == b"ID3 recording"
+    assert os.listdir(str(tmp_path)) == ["aaaa-1111.mp3"]
+
+
+async def test_fetch_recording_already_downloaded(client, fake_nexmo, tmp_path):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    (tmp_path / "aaaa-1111.mp3").write_bytes(b"ID3 recording")
+
+    await fetch(client, f"{fake_nexmo.url}/v1/files/aaaa-1111", str(tmp_path))
+
+    # Only checked the size of the recording.
+    assert fake_nexmo.recording_downloads == 1
+
+
+def test_fetch_recording_known_size(client, tmp_path):
+    (tmp_path / "aaaa-1111.mp3").write_bytes(b"ID3 recording")
+
+    # Nothing is requested from Nexmo.
+    fetch_recording(
+        client, "http://127.0.0.1:1/v1/files/aaaa-1111", str(tmp_path), size=13
+    )
+
+
+async def test_fetch_recording_size_changed(client, fake_nexmo, tmp_path):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    (tmp_path / "aaaa-1111.mp3").write_bytes(b"ID3")
+
+    path = await fetch(client, f"{fake_nexmo.url}/v1/files/aaaa-1111", str(tmp_path))
+
+    assert open(path, "rb").read() == b"ID3 recording"
+
+
+async def test_fetch_recording_not_found(client, fake_nexmo, tmp_path):
+    with pytest.raises(nexmo.ClientError):
+        await fetch(client, f"{fake_nexmo.url}/v1/files/missing", str(tmp_path))
+
+
+async def test_download_recording_jobs(fake_nexmo, private_key, monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    urls = []
+    for n in range(5):
+        fake_nexmo.recordings[f"aaaa-{n}"] = b"ID3 recording"
+        urls.append(f"{fake_nexmo.url}/v1/files/aaaa-{n}")
+    urls.append(f"{fake_nexmo.url}/v1/files/missing")
+
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(
+        None, CliRunner().invoke, download_recording, ["--jobs", "3"] + urls
+    )
+
+    assert result.exit_code == 1
+    assert "Failed to download" in result.output
+    assert sorted(os.listdir(str(tmp_path / "recordings"))) == [
+        f"aaaa-{n}.mp3" for n in range(5)
+    ]
+
+
+def test_read_recordings():
+    lines = [
+        "https://api.nexmo.com/v1/files/aaaa-1111\n",
+        "\n",
+        '{"recording_url": "https://api.nexmo.com/v1/files/bbbb-2222", "size": 13}\n',
+        '{"url": "https://api.nexmo.com/v1/files/cccc-3333"}',
+    ]
+
+    assert list(read_recordings(lines)) == [
+        ("https://api.nexmo.com/v1/files/aaaa-1111", {}),
+        (
+            "https://api.nexmo.com/v1/files/bbbb-2222",
+            {"recording_url": "https://api.nexmo.com/v1/files/bbbb-2222", "size": 13},
+        ),
+        (
+            "https://api.nexmo.com/v1/files/cccc-3333",
+            {"url": "https://api.nexmo.com/v1/files/cccc-3333"},
+        ),
+    ]
+
+
+def test_read_recordings_invalid_lines():
+    lines = [
+        '{"recording_url": "https://api.nexmo.com/v1/files/aaaa-1111"',
+        '{"foo": 1}',
+        "https://api.nexmo.com/v1/files/bbbb-2222",
+    ]
+    progress = Progress()
+
+    assert list(read_recordings(lines, progress)) == [
+        ("https://api.nexmo.com/v1/files/bbbb-2222", {})
+    ]
+    assert progress.failed == 2
+
+
+def test_format_size():
+    assert format_size(512) == "512.0 B"
+    assert format_size(1500000) == "1.5 MB"
+    assert format_size(2 * 10 ** 12) == "2000.0 GB"
+
+
+async def test_download_recording_from_stdin(
+    fake_nexmo, private_key, monkeypatch, tmp_path
+):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    fake_nexmo.recordings["bbbb-2222"] = b"ID3 recording"
+    stdin = (
+        f"{fake_nexmo.url}/v1/files/aaaa-1111\n"
+        f'{{"recording_url": "{fake_nexmo.url}/v1/files/bbbb-2222", "size": 13}}\n'
+    )
+
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(
+        None,
+        lambda: CliRunner().invoke(
+            download_recording, ["--from-file", "-"], input=stdin
+        ),
+    )
+
+    assert result.exit_code == 0
+    assert "Downloaded 2 recordings, 26.0 B" in result.output
+    assert sorted(os.listdir(str(tmp_path / "recordings"))) == [
+        "aaaa-1111.mp3",
+        "bbbb-2222.mp3",
+    ]
+
+
+async def test_download_recording_invalid_line(
+    fake_nexmo, private_key, monkeypatch, tmp_path
+):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    fake_nexmo.recordings["bbbb-2222"] = b"ID3 recording"
+    stdin = (
+        f"{fake_nexmo.url}/v1/files/aaaa-1111\n"
+        '{"foo": 1}\n'
+        f"{fake_nexmo.url}/v1/files/bbbb-2222\n"
+    )
+
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(
+        None,
+        lambda: CliRunner().invoke(
+            download_recording, ["--from-file", "-"], input=stdin
+        ),
+    )
+
+    assert result.exit_code == 1
+    assert 'Invalid recording on line 2: {"foo": 1}' in result.output
+    assert "Downloaded 2 recordings, 26.0 B" in result.output
+    assert "1 failed." in result.output
+    assert sorted(os.listdir(str(tmp_path / "recordings"))) == [
+        "aaaa-1111.mp3",
+        "bbbb-2222.mp3",
+    ]
+
+
+async def test_cli_downloads_by_default(fake_nexmo, private_key, monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(
+        None, CliRunner().invoke, cli, [f"{fake_nexmo.url}/v1/files/aaaa-1111"]
+    )
+
+    assert result.exit_code == 0
+    assert os.listdir(str(tmp_path / "recordings")) == ["aaaa-1111.mp3"]
+
+
+async def test_sync(fake_nexmo, private_key, monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    fake_nexmo.recordings["bbbb-2222"] = b"ID3 another recording"
+
+    def listing():
+        return "".join(
+            f'{{"recording_url": "{fake_nexmo.url}/v1/files/{uuid}", '
+            f'"size": {len(recording)}}}\n'
+            for uuid, recording in fake_nexmo.recordings.items()
+        )
+
+    async def sync():
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None,
+            lambda: CliRunner().invoke(cli, ["sync", "--jobs", "2"], input=listing()),
+        )
+
+    result = await sync()
+    assert result.exit_code == 0
+    assert fake_nexmo.recording_downloads == 2
+    manifest = Manifest(str(tmp_path / "recordings" / "manifest.sqlite3"))
+    assert len(manifest) == 2
+    assert manifest.get("aaaa-1111") == (
+        13,
+        "c0e13e03e266939fd32a4ece3ba5f80b5d178ffba162fed2f70b336a810aecae",
+    )
+    manifest.close()
+
+    result = await sync()
+    assert result.exit_code == 0
+    assert "Skipped 2 recordings already up to date." in result.output
+    assert fake_nexmo.recording_downloads == 2
+
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording, edited"
+    result = await sync()
+    assert result.exit_code == 0
+    assert "Skipped 1 recordings already up to date." in result.output
+    assert fake_nexmo.recording_downloads == 3
+    assert (tmp_path / "recordings" / "aaaa-1111.mp3").read_bytes() == (
+        b"ID3 recording, edited"
+    )
+
+
+async def test_sync_corrupted_recording(fake_nexmo, private_key, monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    listing = (
+        f'{{"recording_url": "{fake_nexmo.url}/v1/files/aaaa-1111", "size": 13}}\n'
+    )
+
+    async def sync():
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, lambda: CliRunner().invoke(cli, ["sync"], input=listing)
+        )
+
+    assert (await sync()).exit_code == 0
+    # Same size, different content.
+    (tmp_path / "recordings" / "aaaa-1111.mp3").write_bytes(b"ID3 rec0rding")
+
+    result = await sync()
+    assert result.exit_code == 0
+    assert "Skipped 0 recordings already up to date." in result.output
+    assert fake_nexmo.recording_downloads == 2
+    assert (tmp_path / "recordings" / "aaaa-1111.mp3").read_bytes() == (
+        b"ID3 recording"
+    )
+
+
+async def test_sync_without_sizes(fake_nexmo, private_key, monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
+    monkeypatch.chdir(tmp_path)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    listing = f"{fake_nexmo.url}/v1/files/aaaa-1111\n"
+    checksums = []
+    monkeypatch.setattr(
+        download_recording_main,
+        "file_checksum",
+        lambda path: checksums.append(path) or file_checksum(path),
+    )
+
+    async def sync():
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, lambda: CliRunner().invoke(cli, ["sync"], input=listing)
+        )
+
+    assert (await sync()).exit_code == 0
+    manifest = Manifest(str(tmp_path / "recordings" / "manifest.sqlite3"))
+
+    def downloaded_at():
+        return manifest.db.execute("SELECT downloaded_at FROM recordings").fetchone()
+
+    first_downloaded_at = downloaded_at()
+    del checksums[:]
+
+    # Nexmo is asked the size, the file is only checked against the manifest.
+    result = await sync()
+    assert result.exit_code == 0
+    assert "Downloaded 0 recordings" in result.output
+    assert "Skipped 1 recordings already up to date." in result.output
+    assert len(checksums) == 1
+    assert downloaded_at() == first_downloaded_at
+    manifest.close()
@@ -0,0 +1,35 @@
+import threading
+
+from webservice.executor import Executor
+
+
+def test_stats():
+    executor = Executor(1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    running = executor.submit(block)
+    started.wait()
+    queued = executor.submit(lambda: 42)
+
+    assert executor.stats() == {
+        "max_workers": 1,
+        "queued": 1,
+        "active": 1,
+        "completed": 0,
+    }
+
+    release.set()
+    running.result()
+    assert queued.result() == 42
+    assert executor.stats() == {
+        "max_workers": 1,
+        "queued": 0,
+        "active": 0,
+        "completed": 2,
+    }
+    executor.shutdown()
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from webservice.ncco import NCCOTemplate, field
+
+
+def test_render():
+    template = NCCOTemplate(
+        [
+            {"action": "talk", "text": f"Hello {field('name')}, welcome."},
+            {"action": "conversation", "name": field("conversation_uuid")},
+        ]
+    )
+
+    ncco = template.render(name='Miss "Islington"', conversation_uuid="CON-123-456")
+
+    assert json.loads(ncco) == [
+        {"action": "talk", "text": 'Hello Miss "Islington", welcome.'},
+        {"action": "conversation", "name": "CON-123-456"},
+    ]
+
+
+def test_render_without_fields():
+    template = NCCOTemplate([{"action": "talk", "text": "Hello"}])
+
+    assert template.render() == b'[{"action": "talk", "text": "Hello"}]'
+
+
+def test_render_converts_values_to_strings():
+    template = NCCOTemplate([{"action": "talk", "text": f"Hello {field('name')}"}])
+
+    assert json.loads(template.render(name=None)) == [
+        {"action": "talk", "text": "Hello None"}
+    ]
+
+def test_render_with_orjson():
+    orjson = pytest.importorskip("orjson")
+    template = NCCOTemplate(
+        [{"action": "talk", "text": f"Hello {field('name')}"}], orjson.dumps
+    )
+
+    ncco = template.render(name='Miss "Islington" ☕')
+
+    assert json.loads(ncco) == [{"action": "talk", "text": 'Hello Miss "Islington" ☕'}]
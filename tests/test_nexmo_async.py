@@ -0,0 +1,160 @@
+import asyncio
+
+import aiohttp
+import nexmo
+import pytest
+
+from webservice import nexmo_async, nexmo_client
+
+
+@pytest.fixture
+def client(loop, fake_nexmo, private_key):
+    async def create_session():
+        return nexmo_async.create_session(limit=10, limit_per_host=0)
+
+    session = loop.run_until_complete(create_session())
+    client = nexmo_client.Client(
+        key="apikey", secret="sssh", application_id="app_id", private_key=private_key
+    )
+    yield nexmo_async.Client(session, client)
+    loop.run_until_complete(session.close())
+
+
+async def test_create_call(client, fake_nexmo):
+    params = {
+        "to": [{"type": "phone", "number": "16040001234"}],
+        "from": {"type": "phone", "number": "1800123456"},
+        "answer_url": ["http://example.com/answer/"],
+    }
+
+    response = await client.create_call(params)
+
+    assert response["status"] == "started"
+    assert fake_nexmo.calls_created == [params]
+
+
+async def test_create_call_kwargs(client, fake_nexmo):
+    await client.create_call(
+        to=[{"type": "phone", "number": "16040001234"}],
+        answer_url=["http://example.com/answer/"],
+    )
+
+    assert fake_nexmo.calls_created[0]["to"][0]["number"] == "16040001234"
+
+
+async def test_send_speech(client, fake_nexmo):
+    response = await client.send_speech("aaaa-bbbb", text="Hello")
+
+    assert response["uuid"] == "aaaa-bbbb"
+    assert fake_nexmo.speech_sent == [{"uuid": "aaaa-bbbb", "text": "Hello"}]
+
+
+async def test_update_call(client, fake_nexmo):
+    response = await client.update_call("aaaa-bbbb", action="hangup")
+
+    assert response is None
+    assert fake_nexmo.calls_updated == [{"uuid": "aaaa-bbbb", "action": "hangup"}]
+
+
+async def test_send_message(client, fake_nexmo):
+    response = await client.send_message(
+        {"from": "5678", "to": "1234", "text": "onetwothree"}
+    )
+
+    assert response["messages"][0]["status"] == "0"
+    assert fake_nexmo.messages_sent == [
+        {"from": "5678", "to": "1234", "text": "onetwothree"}
+    ]
+
+
+async def test_get_recording(client, fake_nexmo):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+
+    recording = await client.get_recording(f"{fake_nexmo.url}/v1/files/aaaa-1111")
+
+    assert recording == b"ID3 recording"
+
+
+async def test_get_recording_not_found(client, fake_nexmo):
+    with pytest.raises(nexmo.ClientError) as exc_info:
+        await client.get_recording(f"{fake_nexmo.url}/v1/files/missing")
+
+    assert str(exc_info.value) == "404 response from 127.0.0.1"
+
+
+async def test_open_recording(client, fake_nexmo):
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+
+    async with await client.open_recording(
+        f"{fake_nexmo.url}/v1/files/aaaa-1111"
+    ) as response:
+        assert response.content_type == "audio/mpeg"
+        assert await response.content.read() == b"ID3 recording"
+
+
+async def test_slow_recording_outlasts_session_timeout(client, fake_nexmo):
+    # Stands for aiohttp's default session timeout, 300 seconds in total.
+    session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0.1))
+    slow_client = nexmo_async.Client(session, client.client)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    fake_nexmo.recording_pause = 0.3
+
+    try:
+        async with await slow_client.open_recording(
+            f"{fake_nexmo.url}/v1/files/aaaa-1111"
+        ) as response:
+            assert await response.content.read() == b"ID3 recording"
+        recording = await slow_client.get_recording(
+            f"{fake_nexmo.url}/v1/files/aaaa-1111"
+        )
+        assert recording == b"ID3 recording"
+    finally:
+        await session.close()
+
+
+async def test_stalled_recording_times_out(client, fake_nexmo, monkeypatch):
+    monkeypatch.setattr(nexmo_async, "RECORDING_READ_TIMEOUT", 0.05)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    fake_nexmo.recording_pause = 0.3
+
+    with pytest.raises(asyncio.TimeoutError):
+        await client.get_recording(f"{fake_nexmo.url}/v1/files/aaaa-1111")
+
+
+async def test_open_recording_not_found(client, fake_nexmo):
+    with pytest.raises(nexmo.ClientError):
+        await client.open_recording(f"{fake_nexmo.url}/v1/files/missing")
+
+
+async def test_client_error_message(client, fake_nexmo):
+    fake_nexmo.call_errors["0000"] = (
+        400,
+        {"type": "BAD_REQUEST", "title": "Bad Request", "detail": "Invalid to"},
+    )
+
+    with pytest.raises(nexmo.ClientError) as exc_info:
+        await client.create_call(to=[{"type": "phone", "number": "0000"}])
+
+    assert str(exc_info.value) == "Bad Request: Invalid to (BAD_REQUEST)"
+
+
+async def test_authentication_error(client, fake_nexmo):
+    client.client.api_key = ""
+
+    with pytest.raises(nexmo.AuthenticationError):
+        await client.send_message({"from": "5678", "to": "1234", "text": "hi"})
+
+
+async def test_server_error(client, fake_nexmo):
+    fake_nexmo.call_errors["16040001234"] = (500, {})
+
+    with pytest.raises(nexmo.ServerError):
+        await client.create_call(to=[{"type": "phone", "number": "16040001234"}])
+
+
+async def test_request_timeout(client, fake_nexmo, monkeypatch):
+    monkeypatch.setattr(nexmo_async, "REQUEST_TIMEOUT", 0.05)
+    fake_nexmo.call_delays["16040001234"] = 1
+
+    with pytest.raises(asyncio.TimeoutError):
+        await client.create_call(to=[{"type": "phone", "number": "16040001234"}])
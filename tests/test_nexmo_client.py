@@ -0,0 +1,45 @@
+import time
+
+import jwt
+import pytest
+
+from webservice import nexmo_client
+
+
+@pytest.fixture
+def client(private_key):
+    return nexmo_client.Client(application_id="app_id", private_key=private_key)
+
+
+def test_jwt_is_reused(client):
+    token = client.generate_application_jwt()
+
+    assert client.generate_application_jwt() is token
+    claims = jwt.decode(token, options={"verify_signature": False})
+    assert claims["application_id"] == "app_id"
+    assert claims["exp"] - claims["iat"] == nexmo_client.JWT_LIFETIME
+
+
+def test_jwt_is_refreshed_before_expiry(client, monkeypatch):
+    token = client.generate_application_jwt()
+
+    later = time.time() + nexmo_client.JWT_LIFETIME - nexmo_client.JWT_REFRESH_MARGIN
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    assert client.generate_application_jwt() != token
+
+
+def test_private_key_is_parsed_once(client):
+    client.generate_application_jwt()
+    signing_key = client._signing_key
+
+    client._token = None
+    client.generate_application_jwt()
+
+    assert client._signing_key is signing_key
+
+
+def test_headers_use_cached_jwt(client):
+    headers = client._headers()
+
+    assert headers["Authorization"] == b"Bearer " + client.generate_application_jwt()
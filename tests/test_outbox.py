@@ -0,0 +1,108 @@
+import asyncio
+
+import nexmo
+import pytest
+
+from webservice.outbox import Outbox
+
+
+@pytest.fixture
+def outbox(loop, tmp_path):
+    outbox = Outbox(
+        str(tmp_path / "outbox.sqlite3"),
+        backoff=0.01,
+        max_attempts=3,
+        poll_interval=0.01,
+    )
+    yield outbox
+    outbox.close()
+
+
+class FlakyClient:
+    """Nexmo client failing the first calls to send_message with the errors."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.messages_sent = []
+
+    async def send_message(self, params):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.messages_sent.append(params)
+
+
+def test_claim(outbox):
+    outbox.put("send_message", [{"to": "1"}, {"to": "2"}])
+
+    assert outbox.claim()[1:] == ("send_message", {"to": "1"}, 1)
+    assert outbox.claim()[1:] == ("send_message", {"to": "2"}, 1)
+    # Both are leased.
+    assert outbox.claim() is None
+    assert len(outbox) == 2
+
+
+def test_retry(outbox):
+    outbox.put("send_message", [{"to": "1"}])
+    message_id = outbox.claim()[0]
+
+    outbox.retry(message_id, "500 response", 0)
+
+    assert outbox.claim() == (message_id, "send_message", {"to": "1"}, 2)
+
+
+def test_messages_survive_restart(outbox, tmp_path):
+    outbox.put("send_message", [{"to": "1"}])
+    outbox.close()
+
+    reopened = Outbox(str(tmp_path / "outbox.sqlite3"))
+    assert reopened.claim()[1:] == ("send_message", {"to": "1"}, 1)
+    reopened.close()
+
+
+async def deliver_until_empty(outbox, client):
+    worker = asyncio.ensure_future(outbox.deliver(client))
+    try:
+        while len(outbox):
+            await asyncio.sleep(0.01)
+    finally:
+        worker.cancel()
+
+
+async def test_deliver_retries(outbox):
+    client = FlakyClient([nexmo.ServerError("500"), ConnectionResetError()])
+
+    await outbox.enqueue("send_message", [{"to": "1"}])
+    await deliver_until_empty(outbox, client)
+
+    assert client.messages_sent == [{"to": "1"}]
+    assert outbox.dead_letters() == []
+
+
+async def test_deliver_gives_up(outbox):
+    client = FlakyClient([nexmo.ServerError("500")] * 3)
+
+    await outbox.enqueue("send_message", [{"to": "1"}])
+    await deliver_until_empty(outbox, client)
+
+    assert client.messages_sent == []
+    assert outbox.dead_letters() == [("send_message", {"to": "1"}, "500")]
+
+
+async def test_deliver_client_error_is_not_retried(outbox):
+    client = FlakyClient([nexmo.ClientError("Invalid number")])
+
+    await outbox.enqueue("send_message", [{"to": "1"}])
+    await deliver_until_empty(outbox, client)
+
+    assert client.errors == []
+    assert outbox.dead_letters() == [("send_message", {"to": "1"}, "Invalid number")]
+
+
+async def test_deliver_authentication_error_is_retried(outbox):
+    client = FlakyClient([nexmo.AuthenticationError()] * 4)
+
+    await outbox.enqueue("send_message", [{"to": "1"}])
+    await deliver_until_empty(outbox, client)
+
+    assert client.messages_sent == [{"to": "1"}]
+    assert outbox.dead_letters() == []
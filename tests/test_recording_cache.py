@@ -0,0 +1,141 @@
+import asyncio
+import os
+
+import pytest
+
+from webservice.recording_cache import RecordingCache, recording_key
+
+
+def test_recording_key():
+    assert (
+        recording_key("https://api.nexmo.com/v1/files/aaaa-1111-bbbb")
+        == "aaaa-1111-bbbb"
+    )
+    assert len(recording_key("https://example.com/recording?id=../../etc")) == 64
+
+
+class FakeContent:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+class FakeUpstream:
+    status = 200
+
+    def __init__(self, chunks, error=None):
+        self.content = FakeContent(chunks, error)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+async def read_all(download):
+    await download.response
+    try:
+        return b"".join([chunk async for chunk in download.read()])
+    finally:
+        download.leave()
+
+
+async def test_join(tmp_path):
+    cache = RecordingCache(str(tmp_path), max_size=1024, chunk_size=4)
+    opened = []
+
+    async def open_upstream():
+        opened.append(True)
+        return FakeUpstream([b"ID3 ", b"reco", b"rding"])
+
+    assert await cache.lookup("aaaa-1111") is None
+    download = cache.join("aaaa-1111", open_upstream)
+    await download.response
+    chunks = download.read()
+    # Streamed before the download is complete.
+    assert await chunks.__anext__() == b"ID3 "
+    assert await cache.lookup("aaaa-1111") is None
+    assert b"".join([chunk async for chunk in chunks]) == b"recording"
+    download.leave()
+
+    path = await cache.lookup("aaaa-1111")
+    assert open(path, "rb").read() == b"ID3 recording"
+    assert os.listdir(str(tmp_path)) == ["aaaa-1111.mp3"]
+    assert len(opened) == 1
+
+
+async def test_join_concurrent(tmp_path):
+    cache = RecordingCache(str(tmp_path), max_size=1024, chunk_size=4)
+    opened = []
+
+    async def open_upstream():
+        opened.append(True)
+        return FakeUpstream([b"ID3 ", b"reco", b"rding"])
+
+    contents = await asyncio.gather(
+        *(read_all(cache.join("aaaa-1111", open_upstream)) for _ in range(5))
+    )
+
+    assert contents == [b"ID3 recording"] * 5
+    assert len(opened) == 1
+
+
+async def test_join_error(tmp_path):
+    cache = RecordingCache(str(tmp_path), max_size=1024, chunk_size=4)
+
+    async def open_upstream():
+        return FakeUpstream([b"ID3"], ConnectionResetError())
+
+    with pytest.raises(ConnectionResetError):
+        await read_all(cache.join("aaaa-1111", open_upstream))
+
+    await asyncio.sleep(0.01)
+    assert os.listdir(str(tmp_path)) == []
+
+
+async def test_close(tmp_path):
+    cache = RecordingCache(str(tmp_path), max_size=1024, chunk_size=4)
+
+    async def open_upstream():
+        await asyncio.sleep(60)
+
+    download = cache.join("aaaa-1111", open_upstream)
+    await cache.close()
+
+    with pytest.raises(ConnectionAbortedError):
+        await download.response
+    download.leave()
+    await asyncio.sleep(0.01)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_evict(tmp_path):
+    cache = RecordingCache(str(tmp_path), max_size=10, chunk_size=4)
+    for n, key in enumerate(["oldest", "older", "newest"]):
+        path = cache.path(key)
+        with open(path, "wb") as f:
+            f.write(b"12345")
+        os.utime(path, (n, n))
+
+    cache.evict()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["newest.mp3", "older.mp3"]
+
+
+def test_evict_keep(tmp_path):
+    cache = RecordingCache(str(tmp_path), max_size=4, chunk_size=4)
+    path = cache.path("recording")
+    with open(path, "wb") as f:
+        f.write(b"12345")
+
+    cache.evict(keep=path)
+
+    assert os.listdir(str(tmp_path)) == ["recording.mp3"]
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+
+from webservice.roster import (
+    Roster,
+    RosterFile,
+    load_phone_numbers,
+    normalize_phone_number,
+)
+
+PHONE_NUMBERS = [
+    {"name": "Mariatta", "phone": "+1 (604) 000-1234"},
+    {"name": "Miss Islington", "phone": "17782223333"},
+]
+
+
+def test_normalize_phone_number():
+    assert normalize_phone_number("+1 (604) 000-1234") == "16040001234"
+    assert normalize_phone_number("16040001234") == "16040001234"
+    assert normalize_phone_number(16040001234) == "16040001234"
+
+
+def test_owner():
+    roster = Roster(PHONE_NUMBERS)
+
+    assert roster.owner("16040001234") == "Mariatta"
+    assert roster.owner("+17782223333") == "Miss Islington"
+
+
+def test_owner_not_found():
+    roster = Roster(PHONE_NUMBERS)
+
+    assert roster.owner("0000000") is None
+
+
+def test_iter():
+    roster = Roster(PHONE_NUMBERS)
+
+    assert list(roster) == PHONE_NUMBERS
+    assert len(roster) == 2
+
+
+def test_load_phone_numbers(tmp_path):
+    path = tmp_path / "phone_numbers.json"
+    path.write_text(json.dumps(PHONE_NUMBERS))
+
+    assert load_phone_numbers(str(path)) == PHONE_NUMBERS
+
+
+def test_roster_file_json(tmp_path):
+    path = tmp_path / "phone_numbers.json"
+    path.write_text(json.dumps(PHONE_NUMBERS))
+
+    roster_file = RosterFile(str(path))
+
+    assert list(roster_file.roster) == PHONE_NUMBERS
+
+
+def test_roster_file_yaml(tmp_path):
+    path = tmp_path / "phone_numbers.yaml"
+    path.write_text(
+        """
+- name: Mariatta
+  phone: "16040001234"
+"""
+    )
+
+    roster_file = RosterFile(str(path))
+
+    assert roster_file.roster.owner("16040001234") == "Mariatta"
+
+
+def test_roster_file_reload(tmp_path):
+    path = tmp_path / "phone_numbers.json"
+    path.write_text(json.dumps(PHONE_NUMBERS))
+    roster_file = RosterFile(str(path))
+    roster = roster_file.roster
+
+    assert not roster_file.reload()
+    assert roster_file.roster is roster
+
+    new_path = tmp_path / "new_phone_numbers.json"
+    new_path.write_text(json.dumps(PHONE_NUMBERS[:1]))
+    os.replace(str(new_path), str(path))
+
+    assert roster_file.reload()
+    assert len(roster_file.roster) == 1
+    # Requests which already got the previous roster keep using it.
+    assert len(roster) == 2
+
+
+def test_roster_file_reload_invalid(tmp_path):
+    path = tmp_path / "phone_numbers.json"
+    path.write_text(json.dumps(PHONE_NUMBERS))
+    roster_file = RosterFile(str(path))
+    roster = roster_file.roster
+
+    path.write_text("[{")
+
+    assert not roster_file.reload()
+    assert roster_file.roster is roster
+
+
+async def test_roster_file_watch(tmp_path):
+    path = tmp_path / "phone_numbers.json"
+    path.write_text(json.dumps(PHONE_NUMBERS))
+    roster_file = RosterFile(str(path))
+
+    watcher = asyncio.ensure_future(roster_file.watch(0.01))
+    path.write_text(json.dumps(PHONE_NUMBERS[:1]))
+    for _ in range(100):
+        if len(roster_file.roster) == 1:
+            break
+        await asyncio.sleep(0.01)
+    watcher.cancel()
+
+    assert len(roster_file.roster) == 1
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from webservice.settings import Settings, SettingsError
+
+ENVIRON = {
+    "NEXMO_API_KEY": "apikey",
+    "NEXMO_API_SECRET": "sssh",
+    "NEXMO_APP_ID": "app_id",
+    "NEXMO_PRIVATE_KEY_VOICE_APP": "private key",
+    "HOTLINE_DESC": "PyCascades Head Office",
+    "PHONE_NUMBERS": json.dumps([{"name": "Mariatta", "phone": "16040001234"}]),
+}
+
+
+def test_from_environ():
+    settings = Settings.from_environ(
+        dict(ENVIRON, AUTO_RECORD="True", ZAPIER_CATCH_HOOK_RECORDING_FINISHED_URL="url")
+    )
+
+    assert settings.hotline_description == "PyCascades Head Office"
+    assert settings.phone_numbers == [{"name": "Mariatta", "phone": "16040001234"}]
+    assert settings.auto_record is True
+    assert settings.recording_event_url == "url"
+    assert settings.dial_in_background is False
+    assert settings.sms_concurrency == 10
+    assert settings.json_encoder == "json"
+    assert settings.web_concurrency == 1
+
+
+def test_settings_are_read_only():
+    settings = Settings.from_environ(ENVIRON)
+
+    with pytest.raises(AttributeError):
+        settings.hotline_description = "CoC hotline"
+
+
+def test_missing_settings_are_reported_at_once():
+    environ = dict(ENVIRON, AUTO_RECORD="true")
+    del environ["NEXMO_APP_ID"]
+    del environ["PHONE_NUMBERS"]
+
+    with pytest.raises(SettingsError) as exc_info:
+        Settings.from_environ(environ)
+
+    assert str(exc_info.value) == (
+        "missing environment variables: NEXMO_APP_ID, PHONE_NUMBERS, "
+        "ZAPIER_CATCH_HOOK_RECORDING_FINISHED_URL"
+    )
+
+
+def test_invalid_settings():
+    environ = dict(ENVIRON, SMS_CONCURRENCY="0", PHONE_NUMBERS="{}")
+
+    with pytest.raises(SettingsError) as exc_info:
+        Settings.from_environ(environ)
+
+    assert str(exc_info.value) == (
+        "PHONE_NUMBERS must be a JSON list; SMS_CONCURRENCY must be a number, at least 1"
+    )
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf"])
+def test_numbers_must_be_finite(value):
+    with pytest.raises(SettingsError) as exc_info:
+        Settings.from_environ(dict(ENVIRON, WEBHOOK_DEDUPE_TTL=value))
+
+    assert str(exc_info.value) == "WEBHOOK_DEDUPE_TTL must be a number, at least 0"
+
+
+def test_invalid_json_encoder():
+    with pytest.raises(SettingsError) as exc_info:
+        Settings.from_environ(dict(ENVIRON, JSON_ENCODER="yaml"))
+
+    assert str(exc_info.value) == "JSON_ENCODER must be one of: json, orjson"
+
+
+def test_phone_numbers_file():
+    environ = dict(ENVIRON, PHONE_NUMBERS_FILE="phone_numbers.yaml")
+    del environ["PHONE_NUMBERS"]
+
+    settings = Settings.from_environ(environ)
+
+    assert settings.phone_numbers is None
+    assert settings.phone_numbers_file == "phone_numbers.yaml"
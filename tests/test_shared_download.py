@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from webservice.shared_download import SharedDownloads
+
+
+class FakeContent:
+    def __init__(self, chunks, started):
+        self.chunks = chunks
+        self.started = started
+
+    async def iter_chunked(self, size):
+        self.started.set()
+        for chunk in self.chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+
+class FakeUpstream:
+    status = 200
+
+    def __init__(self, chunks, started):
+        self.content = FakeContent(chunks, started)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+async def read_all(download):
+    await download.response
+    try:
+        return b"".join([chunk async for chunk in download.read()])
+    finally:
+        download.leave()
+
+
+async def test_concurrent_readers_share_download():
+    downloads = SharedDownloads(chunk_size=4)
+    started = asyncio.Event()
+    opened = []
+
+    async def open_upstream():
+        opened.append(True)
+        return FakeUpstream([b"ID3 ", b"reco", b"rding"], started)
+
+    first = downloads.join("url", open_upstream)
+    first_read = asyncio.ensure_future(read_all(first))
+    await started.wait()
+    await asyncio.sleep(0.015)
+    # Joins after the first chunks were downloaded.
+    second = downloads.join("url", open_upstream)
+
+    assert second is first
+    assert await asyncio.gather(first_read, read_all(second)) == [
+        b"ID3 recording",
+        b"ID3 recording",
+    ]
+    assert len(opened) == 1
+    assert first._file.closed
+
+
+async def test_finished_download_is_not_joined():
+    downloads = SharedDownloads(chunk_size=4)
+
+    async def open_upstream():
+        return FakeUpstream([b"ID3"], asyncio.Event())
+
+    first = downloads.join("url", open_upstream)
+    await read_all(first)
+    await first.task
+
+    assert downloads.join("url", open_upstream) is not first
+
+
+async def test_upstream_error():
+    downloads = SharedDownloads(chunk_size=4)
+
+    async def open_upstream():
+        raise ConnectionResetError()
+
+    download = downloads.join("url", open_upstream)
+
+    with pytest.raises(ConnectionResetError):
+        await download.response
+    download.leave()
+
+
+async def test_close():
+    downloads = SharedDownloads(chunk_size=4)
+
+    async def open_upstream():
+        await asyncio.sleep(60)
+
+    download = downloads.join("url", open_upstream)
+    await downloads.close()
+
+    with pytest.raises(ConnectionAbortedError):
+        await download.response
+    download.leave()
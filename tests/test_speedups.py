@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from webservice import speedups
+
+
+def test_json_dumps():
+    assert speedups.json_dumps({"name": 'Miss "Islington"'}) == (
+        b'{"name": "Miss \\"Islington\\""}'
+    )
+
+
+def test_get_dumps_json():
+    assert speedups.get_dumps("json") is speedups.json_dumps
+
+
+def test_get_dumps_orjson():
+    orjson = pytest.importorskip("orjson")
+
+    assert speedups.get_dumps("orjson") is orjson.dumps
+
+
+def test_get_dumps_orjson_not_installed(monkeypatch, capsys):
+    monkeypatch.setattr(speedups, "orjson", None)
+
+    assert speedups.get_dumps("orjson") is speedups.json_dumps
+    assert "orjson isn't installed" in capsys.readouterr().out
+
+
+def test_install_uvloop_not_installed(monkeypatch, capsys):
+    monkeypatch.setattr(speedups, "uvloop", None)
+    policy = asyncio.get_event_loop_policy()
+
+    assert speedups.install_uvloop() is False
+    assert asyncio.get_event_loop_policy() is policy
+    assert "uvloop isn't installed" in capsys.readouterr().out
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from webservice.state import MemoryState, SQLiteState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, loop, tmp_path):
+    if request.param == "memory":
+        state = MemoryState(100)
+    else:
+        state = SQLiteState(str(tmp_path / "state.sqlite3"))
+    yield state
+    state.close()
+
+
+async def test_set(state):
+    assert await state.get("key") is None
+
+    await state.set("key", {"calls": ["aaaa-bbbb"]}, 60)
+    assert await state.get("key") == {"calls": ["aaaa-bbbb"]}
+
+    await state.delete("key")
+    assert await state.get("key") is None
+
+
+async def test_add(state):
+    assert await state.add("key", "first", 60) is True
+    assert await state.add("key", "second", 60) is False
+    assert await state.get("key") == "first"
+
+
+async def test_expiry(state):
+    await state.set("key", "value", 0.01)
+    await asyncio.sleep(0.02)
+
+    assert await state.get("key") is None
+    assert await state.add("key", "value", 60) is True
+
+
+async def test_append(state):
+    await state.append("key", "aaaa-bbbb", 60)
+    await state.append("key", "cccc-dddd", 60)
+
+    assert await state.get("key") == ["aaaa-bbbb", "cccc-dddd"]
+
+
+async def test_count(state):
+    await state.set("conversation:1", 1, 60)
+    await state.set("conversation:2", 2, 60)
+    await state.set("answered:1", 1, 60)
+
+    assert await state.count("conversation:") == 2
+
+
+async def test_memory_state_max_size():
+    state = MemoryState(2)
+    for n in range(3):
+        await state.set(str(n), n, 60)
+
+    assert await state.get("0") is None
+    assert await state.get("2") == 2
+
+
+async def test_sqlite_state_is_shared(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SQLiteState(path), SQLiteState(path)
+
+    assert await first.add("key", "first", 60) is True
+    assert await second.add("key", "second", 60) is False
+    assert await second.get("key") == "first"
+    first.close()
+    second.close()
+
+
+async def test_sqlite_state_appends_are_not_lost(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SQLiteState(path), SQLiteState(path)
+
+    await asyncio.gather(
+        *[first.append("key", n, 60) for n in range(10)],
+        *[second.append("key", n, 60) for n in range(10, 20)],
+    )
+
+    assert sorted(await first.get("key")) == list(range(20))
+    first.close()
+    second.close()
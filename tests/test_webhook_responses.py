@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from webservice.state import MemoryState, SQLiteState
+from webservice.webhook_responses import DeliveryInProgress, WebhookResponses
+
+
+async def test_redelivery_is_replayed():
+    webhook_responses = WebhookResponses(MemoryState(100), ttl=60)
+    handled = []
+
+    async def handle():
+        handled.append(True)
+        await asyncio.sleep(0.01)
+        return "response"
+
+    # The second delivery arrives while the first one is being handled.
+    assert await asyncio.gather(
+        webhook_responses.get("aaaa-bbbb", handle),
+        webhook_responses.get("aaaa-bbbb", handle),
+    ) == ["response", "response"]
+    assert await webhook_responses.get("aaaa-bbbb", handle) == "response"
+    assert len(handled) == 1
+
+
+async def test_expired_response_is_handled_again():
+    webhook_responses = WebhookResponses(MemoryState(100), ttl=0.01)
+    handled = []
+
+    async def handle():
+        handled.append(True)
+        return "response"
+
+    await webhook_responses.get("aaaa-bbbb", handle)
+    await asyncio.sleep(0.02)
+    await webhook_responses.get("aaaa-bbbb", handle)
+
+    assert len(handled) == 2
+
+
+async def test_failed_delivery_is_handled_again():
+    webhook_responses = WebhookResponses(MemoryState(100), ttl=60)
+
+    async def fail():
+        raise ConnectionResetError()
+
+    async def handle():
+        return "response"
+
+    with pytest.raises(ConnectionResetError):
+        await webhook_responses.get("aaaa-bbbb", fail)
+    assert await webhook_responses.get("aaaa-bbbb", handle) == "response"
+
+
+async def test_redelivery_to_another_process(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first = WebhookResponses(SQLiteState(path), ttl=60, poll_interval=0.01)
+    second = WebhookResponses(SQLiteState(path), ttl=60, poll_interval=0.01)
+    handled = []
+
+    async def handle():
+        handled.append(True)
+        await asyncio.sleep(0.05)
+        return ["response"]
+
+    assert await asyncio.gather(
+        first.get("aaaa-bbbb", handle), second.get("aaaa-bbbb", handle)
+    ) == [["response"], ["response"]]
+    assert len(handled) == 1
+    first.state.close()
+    second.state.close()
+
+
+async def test_redelivery_still_handled_by_another_process(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first = WebhookResponses(SQLiteState(path), ttl=60, poll_interval=0.01)
+    second = WebhookResponses(SQLiteState(path), ttl=60, wait=0.2, poll_interval=0.01)
+    handled = []
+
+    async def handle():
+        handled.append(True)
+        await asyncio.sleep(0.5)
+        return ["response"]
+
+    delivery = asyncio.ensure_future(first.get("aaaa-bbbb", handle))
+    await asyncio.sleep(0.05)
+    with pytest.raises(DeliveryInProgress):
+        await second.get("aaaa-bbbb", handle)
+    assert await delivery == ["response"]
+    assert await second.get("aaaa-bbbb", handle) == ["response"]
+    assert len(handled) == 1
+    first.state.close()
+    second.state.close()
+
+
+async def test_failed_delivery_is_taken_over_by_another_process(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first = WebhookResponses(SQLiteState(path), ttl=60, poll_interval=0.01)
+    second = WebhookResponses(SQLiteState(path), ttl=60, poll_interval=0.01)
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ConnectionResetError()
+
+    async def handle():
+        return ["response"]
+
+    delivery = asyncio.ensure_future(first.get("aaaa-bbbb", fail))
+    await asyncio.sleep(0.01)
+    assert await second.get("aaaa-bbbb", handle) == ["response"]
+    with pytest.raises(ConnectionResetError):
+        await delivery
+    first.state.close()
+    second.state.close()
@@ -1,16 +1,22 @@
+import asyncio
 import json
 import os
-from unittest import mock
 
+import nexmo
 import pytest
-from aiohttp import web
 
+from webservice import nexmo_async, nexmo_client
+from webservice.settings import Settings
 from webservice.__main__ import (
     MUSIC_WHILE_YOU_WAIT,
+    RECORDING_CHUNK_SIZE,
+    cancel_background_tasks,
+    create_app,
+    dial_staff,
     get_nexmo_client,
-    get_phone_number_owner,
-    get_phone_numbers,
-    routes,
+    nexmo_session,
+    send_messages,
+    spawn_background_task,
 )
 
 MOCK_API_KEY = "apikey"
@@ -40,68 +46,91 @@ def test_get_nexmo_client(monkeypatch):
     monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
     monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", MOCK_PRIVATE_KEY)
     monkeypatch.setitem(os.environ, "HOTLINE_DESC", MOCK_HOTLINE_DESC)
+    monkeypatch.setitem(os.environ, "PHONE_NUMBERS", json.dumps(MOCK_PHONE_NUMBERS))
 
-    client = get_nexmo_client()
+    client = get_nexmo_client(Settings.from_environ())
     assert client.application_id == "app_id"
     assert client.private_key == MOCK_PRIVATE_KEY
     assert client.api_key == MOCK_API_KEY
     assert client.api_secret == MOCK_API_SECRET
 
 
-def test_get_phone_numbers(monkeypatch):
-    monkeypatch.setitem(os.environ, "PHONE_NUMBERS", json.dumps(MOCK_PHONE_NUMBERS))
-
-    phone_numbers = get_phone_numbers()
-    assert phone_numbers == MOCK_PHONE_NUMBERS
-
-
-def test_get_phone_number_owner(monkeypatch):
-    monkeypatch.setitem(os.environ, "PHONE_NUMBERS", json.dumps(MOCK_PHONE_NUMBERS))
-
-    owner = get_phone_number_owner(MOCK_PHONE_NUMBERS[0]["phone"])
-    assert owner == MOCK_PHONE_NUMBERS[0]["name"]
-
+@pytest.fixture
+def nexmo_async_client(loop, fake_nexmo, private_key):
+    async def create_session():
+        return nexmo_async.create_session(limit=10, limit_per_host=0)
+
+    session = loop.run_until_complete(create_session())
+    client = nexmo_client.Client(
+        key=MOCK_API_KEY,
+        secret=MOCK_API_SECRET,
+        application_id="app_id",
+        private_key=private_key,
+    )
+    yield nexmo_async.Client(session, client)
+    loop.run_until_complete(session.close())
 
-def test_get_phone_number_owner_not_found(monkeypatch):
-    monkeypatch.setitem(os.environ, "PHONE_NUMBERS", json.dumps(MOCK_PHONE_NUMBERS))
 
-    owner = get_phone_number_owner("0000000")
-    assert owner is None
+async def test_dial_staff(nexmo_async_client, fake_nexmo):
+    results = await dial_staff(
+        nexmo_async_client,
+        MOCK_PHONE_NUMBERS,
+        "1800123456",
+        "http://example.com/answer/",
+    )
 
+    assert all(result["status"] == "started" for result in results)
+    dialed = sorted(call["to"][0]["number"] for call in fake_nexmo.calls_created)
+    assert dialed == sorted(
+        phone_number_dict["phone"] for phone_number_dict in MOCK_PHONE_NUMBERS
+    )
+    for call in fake_nexmo.calls_created:
+        assert call["from"]["number"] == "1800123456"
+        assert call["answer_url"] == ["http://example.com/answer/"]
 
-class FakeNexmoClient:
-    def __init__(self):
-        self.calls_created = []
-        self.speech_sent = []
-        self.messages_sent = []
 
-    def create_call(self, params=None, **kwargs):
-        self.calls_created.append(params)
+async def test_dial_staff_error_does_not_stop_others(
+    nexmo_async_client, fake_nexmo
+):
+    fake_nexmo.call_errors[MOCK_PHONE_NUMBERS[0]["phone"]] = (500, {})
 
-    def send_speech(self, params=None, **kwargs):
-        self.speech_sent.append(params)
+    results = await dial_staff(
+        nexmo_async_client,
+        MOCK_PHONE_NUMBERS,
+        "1800123456",
+        "http://example.com/answer/",
+    )
 
-    def send_message(self, params=None, **kwargs):
-        self.messages_sent.append(params)
+    assert isinstance(results[0], nexmo.ServerError)
+    assert len(fake_nexmo.calls_created) == 1
+    assert (
+        fake_nexmo.calls_created[0]["to"][0]["number"]
+        == MOCK_PHONE_NUMBERS[1]["phone"]
+    )
 
 
 @pytest.fixture
-def webservice_cli(loop, aiohttp_client, monkeypatch):
+def webservice_cli(loop, aiohttp_client, monkeypatch, fake_nexmo, private_key):
     monkeypatch.setitem(os.environ, "PHONE_NUMBERS", json.dumps(MOCK_PHONE_NUMBERS))
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
     monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
-    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", MOCK_PRIVATE_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
     monkeypatch.setitem(os.environ, "HOTLINE_DESC", MOCK_HOTLINE_DESC)
 
-    app = web.Application()
-    app.router.add_routes(routes)
+    app = create_app()
     return loop.run_until_complete(aiohttp_client(app))
 
 
 @pytest.fixture
-def webservice_cli_autorecord(loop, aiohttp_client, monkeypatch):
+def webservice_cli_autorecord(
+    loop, aiohttp_client, monkeypatch, fake_nexmo, private_key
+):
     monkeypatch.setitem(os.environ, "PHONE_NUMBERS", json.dumps(MOCK_PHONE_NUMBERS))
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
     monkeypatch.setitem(os.environ, "NEXMO_APP_ID", "app_id")
-    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", MOCK_PRIVATE_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_PRIVATE_KEY_VOICE_APP", private_key)
     monkeypatch.setitem(
         os.environ,
         "ZAPIER_CATCH_HOOK_RECORDING_FINISHED_URL",
@@ -111,110 +140,504 @@ def webservice_cli_autorecord(loop, aiohttp_client, monkeypatch):
 
     monkeypatch.setitem(os.environ, "AUTO_RECORD", "True")
 
-    app = web.Application()
-    app.router.add_routes(routes)
+    app = create_app()
     return loop.run_until_complete(aiohttp_client(app))
 
 
-async def test_answer_call(webservice_cli):
-    with mock.patch("webservice.__main__.get_nexmo_client") as mock_nexmo_client:
+async def test_answer_call(webservice_cli, fake_nexmo):
+    resp = await webservice_cli.get(
+        "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+    )
+    assert resp.status == 200
+    response = await resp.json()
+
+    assert response[0]["action"] == "talk"
+    assert response[0]["text"] == f"You've reached the {MOCK_HOTLINE_DESC}."
+
+    assert response[1]["action"] == "conversation"
+    assert response[1]["name"] == "CON-123-456"
+    assert response[1]["eventMethod"] == "POST"
+    assert response[1]["musicOnHoldUrl"][0] in MUSIC_WHILE_YOU_WAIT
+    assert response[1]["endOnExit"] is False
+    assert response[1]["startOnEnter"] is False
+
+    assert not response[1].get("record")
+    assert not response[1].get("eventUrl")
+
+    assert len(fake_nexmo.calls_created) == len(MOCK_PHONE_NUMBERS)
+
+
+async def test_answer_call_escapes_conversation_uuid(webservice_cli, fake_nexmo):
+    resp = await webservice_cli.get(
+        "/webhook/answer/",
+        params={
+            "conversation_uuid": 'CON-"123"',
+            "uuid": "aaaa-bbbb",
+            "to": "1800123456",
+            "from": "Restricted",
+        },
+    )
+    assert resp.status == 200
+    response = await resp.json()
 
-        mock_nexmo_client.return_value = FakeNexmoClient()
-        resp = await webservice_cli.get(
-            "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
-        )
-        assert resp.status == 200
-        response = await resp.json()
+    assert response[1]["name"] == 'CON-"123"'
 
-        assert response[0]["action"] == "talk"
-        assert response[0]["text"] == f"You've reached the {MOCK_HOTLINE_DESC}."
 
-        assert response[1]["action"] == "conversation"
-        assert response[1]["name"] == "CON-123-456"
-        assert response[1]["eventMethod"] == "POST"
-        assert response[1]["musicOnHoldUrl"][0] in MUSIC_WHILE_YOU_WAIT
-        assert response[1]["endOnExit"] is False
-        assert response[1]["startOnEnter"] is False
+async def test_answer_conference_call(webservice_cli, fake_nexmo):
+    resp = await webservice_cli.get(
+        "/webhook/answer_conference_call/CON-123-456/aaaa-bbbb/?conversation_uuid=CON-456-789&uuid=dddd-ffff&to=16040001234&from=1800123456"
+    )
+    assert resp.status == 200
+    response = await resp.json()
 
-        assert not response[1].get("record")
-        assert not response[1].get("eventUrl")
+    assert response[0]["action"] == "talk"
+    assert (
+        response[0]["text"]
+        == f"Hello Mariatta, connecting you to {MOCK_HOTLINE_DESC}."
+    )
 
+    assert response[1]["action"] == "conversation"
+    assert response[1]["name"] == "CON-123-456"
+    assert response[1]["startOnEnter"] is True
+    assert response[1]["endOnExit"] is True
 
-async def test_answer_conference_call(webservice_cli):
-    with mock.patch("webservice.__main__.get_nexmo_client") as mock_nexmo_client:
+    assert fake_nexmo.speech_sent == [
+        {"uuid": "aaaa-bbbb", "text": "Mariatta is joining this call."}
+    ]
 
-        mock_nexmo_client.return_value = FakeNexmoClient()
-        resp = await webservice_cli.get(
-            "/webhook/answer_conference_call/CON-123-456/aaaa-bbbb/?conversation_uuid=CON-456-789&uuid=dddd-ffff&to=16040001234&from=1800123456"
-        )
-        assert resp.status == 200
-        response = await resp.json()
 
-        assert response[0]["action"] == "talk"
-        assert (
-            response[0]["text"]
-            == f"Hello Mariatta, connecting you to {MOCK_HOTLINE_DESC}."
-        )
+async def test_answer_conference_call_from_unknown_number(webservice_cli, fake_nexmo):
+    resp = await webservice_cli.get(
+        "/webhook/answer_conference_call/CON-123-456/aaaa-bbbb/?uuid=dddd-ffff&to=15550001111&from=1800123456"
+    )
+    assert resp.status == 200
+    response = await resp.json()
 
-        assert response[1]["action"] == "conversation"
-        assert response[1]["name"] == "CON-123-456"
-        assert response[1]["startOnEnter"] is True
-        assert response[1]["endOnExit"] is True
+    assert response[0]["text"] == f"Hello None, connecting you to {MOCK_HOTLINE_DESC}."
 
+async def test_answer_conference_call_hangs_up_other_staff(
+    webservice_cli, fake_nexmo
+):
+    await webservice_cli.get(
+        "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+    )
+    app = webservice_cli.server.app
+    conversation = await app["conversations"].get("CON-123-456")
+    assert conversation.origin_call_uuid == "aaaa-bbbb"
+    first_call, second_call = conversation.staff_calls
 
-async def test_answer_call_auto_record(webservice_cli_autorecord):
-    with mock.patch("webservice.__main__.get_nexmo_client") as mock_nexmo_client:
-        mock_nexmo_client.return_value = FakeNexmoClient()
-        resp = await webservice_cli_autorecord.get(
+    resp = await webservice_cli.get(
+        f"/webhook/answer_conference_call/CON-123-456/aaaa-bbbb/?uuid={first_call}&to=16040001234&from=1800123456"
+    )
+    assert resp.status == 200
+    await asyncio.gather(*app["background_tasks"])
+    assert fake_nexmo.calls_updated == [{"uuid": second_call, "action": "hangup"}]
+
+    # The calls are only hung up once.
+    resp = await webservice_cli.get(
+        f"/webhook/answer_conference_call/CON-123-456/aaaa-bbbb/?uuid={second_call}&to=17782223333&from=1800123456"
+    )
+    assert resp.status == 200
+    await asyncio.gather(*app["background_tasks"])
+    assert len(fake_nexmo.calls_updated) == 1
+    conversation = await app["conversations"].get("CON-123-456")
+    assert conversation.joined == ["Mariatta", "Miss Islington"]
+
+
+async def test_answer_conference_call_while_dialing_staff(webservice_cli, fake_nexmo):
+    fake_nexmo.call_delays[MOCK_PHONE_NUMBERS[1]["phone"]] = 0.2
+    app = webservice_cli.server.app
+    answer = asyncio.ensure_future(
+        webservice_cli.get(
             "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
         )
+    )
+    conversation = await app["conversations"].get("CON-123-456")
+    while conversation is None or not conversation.staff_calls:
+        await asyncio.sleep(0.01)
+        conversation = await app["conversations"].get("CON-123-456")
+    [first_call] = conversation.staff_calls
+
+    # Mariatta answers while Miss Islington is still being dialed.
+    resp = await webservice_cli.get(
+        f"/webhook/answer_conference_call/CON-123-456/aaaa-bbbb/?uuid={first_call}&to=16040001234&from=1800123456"
+    )
+    assert resp.status == 200
+    assert (await answer).status == 200
+    await asyncio.gather(*app["background_tasks"])
+
+    conversation = await app["conversations"].get("CON-123-456")
+    first_call, second_call = conversation.staff_calls
+    assert fake_nexmo.calls_updated == [{"uuid": second_call, "action": "hangup"}]
+    assert conversation.joined == ["Mariatta"]
+    assert conversation.answered_call == first_call
+
+async def test_answer_call_auto_record(webservice_cli_autorecord):
+    resp = await webservice_cli_autorecord.get(
+        "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+    )
+    assert resp.status == 200
+    response = await resp.json()
+
+    assert response[0]["action"] == "talk"
+    assert (
+        response[0]["text"]
+        == f"You've reached the {MOCK_HOTLINE_DESC}. This call is recorded."
+    )
+
+    assert response[1]["action"] == "conversation"
+    assert response[1]["name"] == "CON-123-456"
+    assert response[1]["eventMethod"] == "POST"
+    assert response[1]["musicOnHoldUrl"][0] in MUSIC_WHILE_YOU_WAIT
+    assert response[1]["endOnExit"] is False
+    assert response[1]["startOnEnter"] is False
+
+    assert response[1]["record"] is True
+    assert response[1]["eventUrl"] == ["https://hooks.zapier.com/1111/2222"]
+
+
+async def test_inbound_sms(webservice_cli, fake_nexmo):
+    reporter_number = "1234"
+    hotline_number = "5678"
+    text = "onetwothree"
+
+    resp = await webservice_cli.get(
+        f"/webhook/inbound-sms/?msisdn={reporter_number}&to={hotline_number}&text={text}"
+    )
+
+    assert resp.status == 204
+
+    # The messages are sent after responding.
+    await asyncio.gather(*webservice_cli.server.app["background_tasks"])
+
+    # One for each person on staff, one to respond to the reporter.
+    assert len(fake_nexmo.messages_sent) == 3
+    messages = {message["to"]: message for message in fake_nexmo.messages_sent}
+
+    # Check that the organizers got the message.
+    for phone_number_dict in MOCK_PHONE_NUMBERS:
+        message = messages[phone_number_dict["phone"]]
+        assert message["from"] == hotline_number
+        assert text in message["text"]
+
+    # Check the response message
+    response_message = messages[reporter_number]
+    assert response_message["to"] == reporter_number
+    assert response_message["from"] == hotline_number
+    assert MOCK_HOTLINE_DESC in response_message["text"]
+
+
+async def test_answer_call_redelivery(webservice_cli, fake_nexmo):
+    url = "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+    resp = await webservice_cli.get(url)
+    redelivery = await webservice_cli.get(url)
+
+    assert redelivery.status == 200
+    assert redelivery.content_type == "application/json"
+    assert await redelivery.json() == await resp.json()
+    # The staff are only dialed once.
+    assert len(fake_nexmo.calls_created) == len(MOCK_PHONE_NUMBERS)
+
+
+async def test_answer_call_redelivery_to_another_process(
+    loop, aiohttp_client, webservice_cli, fake_nexmo, monkeypatch, tmp_path
+):
+    monkeypatch.setitem(os.environ, "STATE_PATH", str(tmp_path / "state.sqlite3"))
+    first_cli = await aiohttp_client(create_app())
+    second_cli = await aiohttp_client(create_app())
+    url = "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+
+    resp = await first_cli.get(url)
+    redelivery = await second_cli.get(url)
+
+    assert await redelivery.json() == await resp.json()
+    assert len(fake_nexmo.calls_created) == len(MOCK_PHONE_NUMBERS)
+    # The conversation is known to both.
+    conversation = await second_cli.server.app["conversations"].get("CON-123-456")
+    assert len(conversation.staff_calls) == len(MOCK_PHONE_NUMBERS)
+
+
+async def test_inbound_sms_redelivery(webservice_cli, fake_nexmo):
+    url = "/webhook/inbound-sms/?msisdn=1234&to=5678&text=onetwothree&messageId=0A01"
+    resp = await webservice_cli.get(url)
+    redelivery = await webservice_cli.get(url)
+
+    assert resp.status == redelivery.status == 204
+    await asyncio.gather(*webservice_cli.server.app["background_tasks"])
+    assert len(fake_nexmo.messages_sent) == 3
+
+
+async def test_inbound_sms_outbox(
+    loop, aiohttp_client, webservice_cli, fake_nexmo, monkeypatch, tmp_path
+):
+    monkeypatch.setitem(os.environ, "OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    outbox_cli = await aiohttp_client(create_app())
+
+    resp = await outbox_cli.get(
+        "/webhook/inbound-sms/?msisdn=1234&to=5678&text=onetwothree"
+    )
+    assert resp.status == 204
+
+    outbox = outbox_cli.server.app["outbox"]
+    while len(outbox):
+        await asyncio.sleep(0.01)
+    assert len(fake_nexmo.messages_sent) == 3
+
+
+async def test_answer_call_outbox(
+    loop, aiohttp_client, webservice_cli, fake_nexmo, monkeypatch, tmp_path
+):
+    monkeypatch.setitem(os.environ, "OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    outbox_cli = await aiohttp_client(create_app())
+    outbox = outbox_cli.server.app["outbox"]
+    outbox.backoff = outbox.poll_interval = 0.01
+    fake_nexmo.call_errors[MOCK_PHONE_NUMBERS[0]["phone"]] = (500, {})
+
+    resp = await outbox_cli.get(
+        "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+    )
+    assert resp.status == 200
+
+    # The failed call is retried until it succeeds.
+    while len(fake_nexmo.calls_created) < 1:
+        await asyncio.sleep(0.01)
+    del fake_nexmo.call_errors[MOCK_PHONE_NUMBERS[0]["phone"]]
+    while len(outbox):
+        await asyncio.sleep(0.01)
+    assert len(fake_nexmo.calls_created) == len(MOCK_PHONE_NUMBERS)
+
+
+async def test_send_messages_concurrency(nexmo_async_client, fake_nexmo):
+    sending = 0
+    max_sending = 0
+    send_message = nexmo_async_client.send_message
+
+    async def counting_send_message(params):
+        nonlocal sending, max_sending
+        sending += 1
+        max_sending = max(max_sending, sending)
+        try:
+            await asyncio.sleep(0.01)
+            return await send_message(params)
+        finally:
+            sending -= 1
+
+    nexmo_async_client.send_message = counting_send_message
+    messages = [{"from": "5678", "to": str(n), "text": "hi"} for n in range(5)]
+
+    results = await send_messages(nexmo_async_client, messages, 2)
+
+    assert len(results) == 5
+    assert max_sending == 2
+    assert len(fake_nexmo.messages_sent) == 5
+
+
+async def test_proxy_recording(webservice_cli, fake_nexmo, monkeypatch):
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+
+    resp = await webservice_cli.get(
+        "/recordings/",
+        params={
+            "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+            "api_key": MOCK_API_KEY,
+            "api_secret": MOCK_API_SECRET,
+        },
+    )
+
+    assert resp.status == 200
+    assert resp.content_type == "audio/mpeg"
+    assert await resp.read() == b"ID3 recording"
+
+
+async def test_proxy_recording_streams_large_recording(
+    webservice_cli, fake_nexmo, monkeypatch
+):
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
+    recording = os.urandom(RECORDING_CHUNK_SIZE * 3 + 100)
+    fake_nexmo.recordings["aaaa-1111"] = recording
+
+    resp = await webservice_cli.get(
+        "/recordings/",
+        params={
+            "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+            "api_key": MOCK_API_KEY,
+            "api_secret": MOCK_API_SECRET,
+        },
+    )
+
+    assert resp.status == 200
+    assert resp.content_length == len(recording)
+    assert await resp.read() == recording
+
+
+async def test_proxy_recording_concurrent(webservice_cli, fake_nexmo, monkeypatch):
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
+    recording = os.urandom(RECORDING_CHUNK_SIZE * 3 + 100)
+    fake_nexmo.recordings["aaaa-1111"] = recording
+    params = {
+        "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+        "api_key": MOCK_API_KEY,
+        "api_secret": MOCK_API_SECRET,
+    }
+
+    async def download():
+        resp = await webservice_cli.get("/recordings/", params=params)
         assert resp.status == 200
-        response = await resp.json()
+        return await resp.read()
 
-        assert response[0]["action"] == "talk"
-        assert (
-            response[0]["text"]
-            == f"You've reached the {MOCK_HOTLINE_DESC}. This call is recorded."
-        )
+    assert await asyncio.gather(download(), download()) == [recording, recording]
+    assert fake_nexmo.recording_downloads == 1
+
+
+async def test_proxy_recording_range(webservice_cli, fake_nexmo, monkeypatch):
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+
+    resp = await webservice_cli.get(
+        "/recordings/",
+        params={
+            "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+            "api_key": MOCK_API_KEY,
+            "api_secret": MOCK_API_SECRET,
+        },
+        headers={"Range": "bytes=4-"},
+    )
 
-        assert response[1]["action"] == "conversation"
-        assert response[1]["name"] == "CON-123-456"
-        assert response[1]["eventMethod"] == "POST"
-        assert response[1]["musicOnHoldUrl"][0] in MUSIC_WHILE_YOU_WAIT
-        assert response[1]["endOnExit"] is False
-        assert response[1]["startOnEnter"] is False
+    assert resp.status == 206
+    assert resp.headers["Content-Range"] == "bytes 4-12/13"
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert await resp.read() == b"recording"
 
-        assert response[1]["record"] is True
-        assert response[1]["eventUrl"] == ["https://hooks.zapier.com/1111/2222"]
 
+async def test_proxy_recording_not_modified(webservice_cli, fake_nexmo, monkeypatch):
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    params = {
+        "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+        "api_key": MOCK_API_KEY,
+        "api_secret": MOCK_API_SECRET,
+    }
+
+    resp = await webservice_cli.get("/recordings/", params=params)
+    etag = resp.headers["ETag"]
+
+    resp = await webservice_cli.get(
+        "/recordings/", params=params, headers={"If-None-Match": etag}
+    )
 
-async def test_inbound_sms(webservice_cli):
-    with mock.patch("webservice.__main__.get_nexmo_client") as mock_nexmo_client:
-        nexmo_client = FakeNexmoClient()
-        mock_nexmo_client.return_value = nexmo_client
+    assert resp.status == 304
+    assert resp.headers["ETag"] == etag
+    assert await resp.read() == b""
 
-        reporter_number = "1234"
-        hotline_number = "5678"
-        text = "onetwothree"
 
-        resp = await webservice_cli.get(
-            f"/webhook/inbound-sms/?msisdn={reporter_number}&to={hotline_number}&text={text}"
-        )
+async def test_proxy_recording_cache(
+    loop, aiohttp_client, webservice_cli, fake_nexmo, monkeypatch, tmp_path
+):
+    monkeypatch.setitem(os.environ, "NEXMO_API_KEY", MOCK_API_KEY)
+    monkeypatch.setitem(os.environ, "NEXMO_API_SECRET", MOCK_API_SECRET)
+    monkeypatch.setitem(os.environ, "RECORDING_CACHE_DIR", str(tmp_path))
+    cached_cli = await aiohttp_client(create_app())
+    fake_nexmo.recordings["aaaa-1111"] = b"ID3 recording"
+    params = {
+        "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+        "api_key": MOCK_API_KEY,
+        "api_secret": MOCK_API_SECRET,
+    }
+
+    resp = await cached_cli.get("/recordings/", params=params)
+    assert resp.status == 200
+    assert resp.content_type == "audio/mpeg"
+    assert await resp.read() == b"ID3 recording"
+    assert os.listdir(str(tmp_path)) == ["aaaa-1111.mp3"]
+
+    # Served from the cache from now on.
+    del fake_nexmo.recordings["aaaa-1111"]
+    resp = await cached_cli.get(
+        "/recordings/", params=params, headers={"Range": "bytes=4-"}
+    )
+    assert resp.status == 206
+    assert await resp.read() == b"recording"
+
+
+async def test_proxy_recording_unauthorized(webservice_cli, fake_nexmo):
+    resp = await webservice_cli.get(
+        "/recordings/",
+        params={
+            "recording_url": f"{fake_nexmo.url}/v1/files/aaaa-1111",
+            "api_key": MOCK_API_KEY,
+            "api_secret": "wrong",
+        },
+    )
+
+    assert resp.status == 401
+
+
+async def test_answer_call_dial_in_background(
+    loop, aiohttp_client, webservice_cli, fake_nexmo, monkeypatch
+):
+    monkeypatch.setitem(os.environ, "DIAL_IN_BACKGROUND", "True")
+    background_cli = await aiohttp_client(create_app())
+    resp = await background_cli.get(
+        "/webhook/answer/?conversation_uuid=CON-123-456&uuid=aaaa-bbbb&to=1800123456&from=Restricted"
+    )
+    assert resp.status == 200
+    response = await resp.json()
+    assert response[1]["name"] == "CON-123-456"
+
+    await asyncio.gather(*background_cli.server.app["background_tasks"])
+    assert len(fake_nexmo.calls_created) == len(MOCK_PHONE_NUMBERS)
+
+
+async def test_cancel_background_tasks():
+    app = create_app()
+    task = spawn_background_task(app, asyncio.sleep(60), "sleeping")
+    assert task in app["background_tasks"]
+
+    await cancel_background_tasks(app)
+
+    assert task.cancelled()
+    assert not app["background_tasks"]
+
+
+async def test_nexmo_session_pool(webservice_cli, monkeypatch):
+    monkeypatch.setitem(os.environ, "NEXMO_POOL_SIZE", "20")
+    monkeypatch.setitem(os.environ, "NEXMO_POOL_SIZE_PER_HOST", "10")
+    app = create_app()
+    app["settings"] = Settings.from_environ()
+
+    sessions = nexmo_session(app)
+    await sessions.__anext__()
+    session = app["nexmo_client"].session
+    assert session.connector.limit == 20
+    assert session.connector.limit_per_host == 10
+
+    with pytest.raises(StopAsyncIteration):
+        await sessions.__anext__()
+    assert session.closed
+
+
+async def test_status(webservice_cli):
+    resp = await webservice_cli.get("/status/")
 
-        assert resp.status == 204
+    assert resp.status == 200
+    response = await resp.json()
+    assert response["executor"]["max_workers"] == 10
+    assert response["executor"]["queued"] == 0
+    assert response["executor"]["active"] == 0
+    assert response["conversations"] == 0
 
-        # One for each person on staff, one to respond to the reporter.
-        assert len(nexmo_client.messages_sent) == 3
 
-        # Check that the organizers got the message.
-        for n, phone_number_dict in enumerate(MOCK_PHONE_NUMBERS):
-            message = nexmo_client.messages_sent[n]
-            assert message["from"] == hotline_number
-            assert message["to"] == phone_number_dict["phone"]
-            assert text in message["text"]
+async def test_health(webservice_cli):
+    resp = await webservice_cli.get("/health/")
 
-        # Check the response message
-        response_message = nexmo_client.messages_sent[-1]
-        assert response_message["to"] == reporter_number
-        assert response_message["from"] == hotline_number
-        assert MOCK_HOTLINE_DESC in response_message["text"]
+    assert resp.status == 200
+    response = await resp.json()
+    assert response["status"] == "ok"
+    assert response["pid"] == os.getpid()
+    assert response["worker"] is None
@@ -0,0 +1,160 @@
+import json
+import os
+import queue
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_health(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/", timeout=5) as resp:
+        return json.load(resp)
+
+
+def wait_for_workers(lines, timeout=30):
+    """Return the PIDs of the workers, by worker ID, once both have started"""
+    pids = {}
+    deadline = time.monotonic() + timeout
+    while len(pids) < 2:
+        try:
+            line = lines.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            pytest.fail(f"workers didn't start: {pids}")
+        # Unbuffered output of another worker can precede it on the line.
+        match = re.search(r"worker (\d+) started, pid (\d+)$", line.rstrip())
+        if match:
+            pids[int(match.group(1))] = int(match.group(2))
+    return pids
+
+
+def wait_for_health(port, pids, timeout=30):
+    """Return the health reported by one of the workers with pids"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            health = get_health(port)
+        except OSError:
+            health = None
+        if health is not None and health["pid"] in pids:
+            return health
+        time.sleep(0.1)
+    pytest.fail("the workers didn't respond")
+
+
+@pytest.fixture
+def webservice_env(private_key):
+    return dict(
+        os.environ,
+        PORT=str(free_port()),
+        WEB_CONCURRENCY="2",
+        PHONE_NUMBERS=json.dumps([{"name": "Mariatta", "phone": "16040001234"}]),
+        NEXMO_API_KEY="apikey",
+        NEXMO_API_SECRET="sssh",
+        NEXMO_APP_ID="app_id",
+        NEXMO_PRIVATE_KEY_VOICE_APP=private_key,
+        HOTLINE_DESC="PyCascades Head Office",
+    )
+
+
+@pytest.fixture
+def start_webservice():
+    processes = []
+
+    def start(env):
+        process = subprocess.Popen(
+            [sys.executable, "-m", "webservice"],
+            env=env,
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        process.port = int(env["PORT"])
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            # The supervisor stops its workers.
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        process.stdout.close()
+
+
+@pytest.fixture
+def supervisor(start_webservice, webservice_env, tmp_path):
+    webservice_env["STATE_PATH"] = str(tmp_path / "state.sqlite3")
+    process = start_webservice(webservice_env)
+    # The lines printed by the supervisor and the workers.
+    process.lines = queue.Queue()
+    threading.Thread(
+        target=lambda: [process.lines.put(line) for line in process.stdout],
+        daemon=True,
+    ).start()
+    return process
+
+
+def test_supervisor(supervisor):
+    pids = wait_for_workers(supervisor.lines)
+    assert set(pids) == {0, 1}
+    health = wait_for_health(supervisor.port, pids.values())
+    assert health["status"] == "ok"
+    assert pids[health["worker"]] == health["pid"]
+
+    # Reloading replaces both workers.
+    supervisor.send_signal(signal.SIGHUP)
+    new_pids = wait_for_workers(supervisor.lines)
+    assert set(new_pids) == {0, 1}
+    assert not set(new_pids.values()) & set(pids.values())
+    health = wait_for_health(supervisor.port, new_pids.values())
+    assert new_pids[health["worker"]] == health["pid"]
+
+    supervisor.send_signal(signal.SIGTERM)
+    assert supervisor.wait(timeout=30) == 0
+
+
+def test_single_worker_without_state_path(start_webservice, webservice_env):
+    process = start_webservice(webservice_env)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            health = get_health(process.port)
+            break
+        except OSError:
+            time.sleep(0.1)
+    else:
+        pytest.fail("the webservice didn't respond")
+    assert health["worker"] is None
+    assert health["pid"] == process.pid
+
+    process.terminate()
+    process.wait(timeout=30)
+    assert "STATE_PATH isn't set, running a single worker" in process.stdout.read()
+
+
+def test_invalid_web_concurrency(start_webservice, webservice_env):
+    webservice_env["WEB_CONCURRENCY"] = "many"
+    process = start_webservice(webservice_env)
+
+    assert process.wait(timeout=30) == 1
+    assert process.stdout.read() == "WEB_CONCURRENCY must be a number, at least 1\n"
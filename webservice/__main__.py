@@ -1,13 +1,44 @@
-import json
+import asyncio
+import base64
+import functools
 import os
 import random
+import sys
 import time
 
 import nexmo
 from aiohttp import web
 
+from webservice import nexmo_async, nexmo_client
+from webservice.conversations import Conversations
+from webservice.executor import Executor
+from webservice.ncco import NCCOTemplate, field
+from webservice.outbox import Outbox
+from webservice.recording_cache import RecordingCache, recording_key
+from webservice.settings import Settings, SettingsError
+from webservice.roster import Roster, RosterFile, RosterSource
+from webservice.shared_download import SharedDownloads
+from webservice.speedups import get_dumps, install_uvloop
+from webservice.state import MemoryState, SQLiteState
+from webservice.webhook_responses import DeliveryInProgress, WebhookResponses
+from webservice.workers import Supervisor, is_worker, listen, run_worker
+
 routes = web.RouteTableDef()
 
+# How long conversations are remembered, in seconds.
+CONVERSATION_TTL = 60 * 60
+
+# Maximum number of keys in the in-memory state backend.
+MAX_STATE_SIZE = 100000
+
+# Size of the chunks recordings are proxied in.
+RECORDING_CHUNK_SIZE = 64 * 1024
+
+# Headers passed through by the recording proxy, so clients can resume downloads
+# and avoid downloading a recording they already have.
+RECORDING_REQUEST_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since")
+RECORDING_RESPONSE_HEADERS = ("Accept-Ranges", "Content-Range", "ETag", "Last-Modified")
+
 MUSIC_WHILE_YOU_WAIT = [
     "https://assets.ctfassets.net/j7pfe8y48ry3/530pLnJVZmiUu8mkEgIMm2/dd33d28ab6af9a2d32681ae80004886e/oaklawn-dreams.mp3",
     "https://assets.ctfassets.net/j7pfe8y48ry3/2toXv1xuOsMm0Yku0YEGya/a792ce81a7866fc77f6768d416018012/broken-shovel.mp3",
@@ -17,59 +48,372 @@ MUSIC_WHILE_YOU_WAIT = [
 ]
 
 
-def get_nexmo_client():
-    """Return an instance of Nexmo client library"""
-    api_key = os.environ.get("NEXMO_API_KEY")
-    api_secret = os.environ.get("NEXMO_API_SECRET")
-    app_id = os.environ.get("NEXMO_APP_ID")
-    private_key = os.environ.get("NEXMO_PRIVATE_KEY_VOICE_APP")
+async def settings(app):
+    """Read the settings once, when the webservice starts.
 
-    client = nexmo.Client(
-        key=api_key, secret=api_secret, application_id=app_id, private_key=private_key
+    The webservice fails to start if a setting is missing or invalid.
+    """
+    app["settings"] = Settings.from_environ()
+    app["dumps"] = get_dumps(app["settings"].json_encoder)
+    yield
+
+
+async def state(app):
+    """Set up the state shared by the webservice processes.
+
+    If STATE_PATH is set, the state is kept in the SQLite database at that
+    path, so processes sharing it, e.g. several web dynos on a shared volume,
+    recognize each other's webhook deliveries and conversations. Otherwise it's
+    kept in memory, for this process only.
+    """
+    path = app["settings"].state_path
+    if path:
+        app["state"] = SQLiteState(path, app["executor"])
+    else:
+        app["state"] = MemoryState(MAX_STATE_SIZE)
+    app["conversations"] = Conversations(app["state"], CONVERSATION_TTL)
+    yield
+    app["state"].close()
+
+
+def get_nexmo_client(settings):
+    """Return an instance of Nexmo client library
+
+    The webservice creates a single client when it starts, and uses it to
+    authenticate its API calls, see nexmo_session.
+    """
+    client = nexmo_client.Client(
+        key=settings.nexmo_api_key,
+        secret=settings.nexmo_api_secret,
+        application_id=settings.nexmo_app_id,
+        private_key=settings.nexmo_private_key,
     )
     return client
 
 
-def get_phone_numbers():
-    """Get the phone numbers from environment variables.
+async def recording_cache(app):
+    """Set up the on-disk cache of proxied recordings.
 
-    Example:
-    [
-        {
-            "name": "Mariatta",
-            "phone": "16040001234"
-        },
+    The cache is used if RECORDING_CACHE_DIR is set. RECORDING_CACHE_SIZE is
+    its maximum size in bytes, 1 GB by default.
+    """
+    settings = app["settings"]
+    directory = settings.recording_cache_dir
+    if not directory:
+        app["recording_cache"] = None
+        yield
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    app["recording_cache"] = RecordingCache(
+        directory,
+        settings.recording_cache_size,
+        RECORDING_CHUNK_SIZE,
+        app["executor"],
+    )
+    yield
+    await app["recording_cache"].close()
+
+
+async def recording_downloads(app):
+    """Keep track of the recording downloads in progress, to share them"""
+    downloads = SharedDownloads(RECORDING_CHUNK_SIZE, app["executor"])
+    app["recording_downloads"] = downloads
+    yield
+    await downloads.close()
+
+
+async def nexmo_session(app):
+    """Create the Nexmo client shared by every request.
+
+    Its API calls go through a pooled keep-alive session, which is closed when
+    the app shuts down. NEXMO_POOL_SIZE and NEXMO_POOL_SIZE_PER_HOST are the
+    size of the pool, in total and per host, 0 means no limit.
+    """
+    settings = app["settings"]
+    async with nexmo_async.create_session(
+        settings.nexmo_pool_size, settings.nexmo_pool_size_per_host
+    ) as session:
+        app["nexmo_client"] = nexmo_async.Client(session, get_nexmo_client(settings))
+        yield
+
+
+async def outbox(app):
+    """Create the outbox the SMS messages and calls are sent from, if enabled.
+
+    If OUTBOX_PATH is set, the webhooks put the messages in the SQLite database
+    at that path, and OUTBOX_WORKERS workers, 4 by default, send them to Nexmo.
+    """
+    settings = app["settings"]
+    if not settings.outbox_path:
+        app["outbox"] = None
+        yield
+        return
+
+    app["outbox"] = Outbox(
+        settings.outbox_path,
+        app["executor"],
+        max_attempts=settings.outbox_max_attempts,
+    )
+    workers = [
+        asyncio.ensure_future(app["outbox"].deliver(app["nexmo_client"]))
+        for _ in range(settings.outbox_workers)
+    ]
+    yield
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    app["outbox"].close()
+
+
+async def executor(app):
+    """Create the thread pool the blocking work of the webservice runs on.
+
+    BLOCKING_POOL_SIZE is its number of threads, 10 by default.
+    """
+    app["executor"] = Executor(app["settings"].blocking_pool_size)
+    yield
+    app["executor"].shutdown(wait=False)
+
+
+async def roster_source(app):
+    """Load the staff roster once, for every request to use.
+
+    When it comes from PHONE_NUMBERS_FILE, the file is checked for changes
+    every PHONE_NUMBERS_POLL_INTERVAL seconds, and the roster is reloaded when
+    it changes.
+    """
+    settings = app["settings"]
+    if not settings.phone_numbers_file:
+        app["roster_source"] = RosterSource(Roster(settings.phone_numbers))
+        yield
+        return
+
+    roster_file = RosterFile(settings.phone_numbers_file)
+    app["roster_source"] = roster_file
+    watcher = asyncio.ensure_future(
+        roster_file.watch(settings.phone_numbers_poll_interval, app["executor"])
+    )
+    yield
+    watcher.cancel()
+    await asyncio.gather(watcher, return_exceptions=True)
+
+
+def get_staff_calls(phone_numbers, hotline_number, answer_url):
+    """Return the parameters of the calls to everyone on staff"""
+    return [
         {
-            "name": "Miss Islington",
-            "phone": "17782223333"
+            "to": [{"type": "phone", "number": phone_number_dict["phone"]}],
+            "from": {"type": "phone", "number": hotline_number},
+            "answer_url": [answer_url],
+            "machine_detection": "hangup",
         }
+        for phone_number_dict in phone_numbers
     ]
+
+
+async def dial_staff(
+    client, phone_numbers, hotline_number, answer_url, on_call=None
+):
+    """Dial everyone on staff concurrently.
+
+    The whole roster is dialed in roughly one round-trip. A failed call is
+    reported but does not prevent the rest of the staff from being dialed.
+    ``await on_call(call_uuid)`` is called as soon as each call is placed.
     """
-    return json.loads(os.environ.get("PHONE_NUMBERS"))
+
+    async def call(params):
+        result = await client.create_call(params)
+        if on_call is not None:
+            await on_call(result["uuid"])
+        return result
+
+    calls = [
+        call(params)
+        for params in get_staff_calls(phone_numbers, hotline_number, answer_url)
+    ]
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    for phone_number_dict, result in zip(phone_numbers, results):
+        if isinstance(result, Exception):
+            print(f"error calling {phone_number_dict['name']}")
+            print(result)
+
+    return results
+
+
+async def hang_up_calls(client, call_uuids):
+    """Hang up the calls concurrently.
+
+    A call which can't be hung up, e.g. because it already ended, is reported
+    but does not prevent the others from being hung up.
+    """
+    results = await asyncio.gather(
+        *[client.update_call(uuid, action="hangup") for uuid in call_uuids],
+        return_exceptions=True,
+    )
+
+    for uuid, result in zip(call_uuids, results):
+        if isinstance(result, Exception):
+            print(f"error hanging up {uuid}")
+            print(result)
+
+    return results
+
+
+async def send_messages(client, messages, concurrency):
+    """Send the SMS messages concurrently, at most concurrency at a time.
+
+    A failed message is reported but does not prevent the others from being
+    sent.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(message):
+        async with semaphore:
+            return await client.send_message(message)
+
+    results = await asyncio.gather(
+        *[send(message) for message in messages], return_exceptions=True
+    )
+
+    for message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            print(f"error sending SMS to {message['to']}")
+            print(result)
+
+    return results
 
 
-def get_phone_number_owner(phone_number):
-    """Return the name of the phone number owner for the given phone number
+def spawn_background_task(app, coro, description):
+    """Run the coroutine as a task tracked by the app.
+
+    The task is cancelled when the app shuts down, and any error it raises is
+    reported instead of being lost.
     """
-    phone_numbers = get_phone_numbers()
-    for phone_number_info in phone_numbers:
-        if phone_number_info["phone"] == phone_number:
-            return phone_number_info["name"]
+    task = asyncio.ensure_future(coro)
+    background_tasks = app["background_tasks"]
+    background_tasks.add(task)
+
+    def on_done(task):
+        background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"error in background task: {description}")
+            print(task.exception())
 
-    return None
+    task.add_done_callback(on_done)
+    return task
 
 
-def get_hotline_description():
-    """Return the description of this hotline, e.g: CoC hotline, or Head office"""
-    return os.environ.get("HOTLINE_DESC")
+async def cancel_background_tasks(app):
+    """Cancel the background tasks still running, and wait for them to finish"""
+    background_tasks = list(app["background_tasks"])
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
 
 
-def is_auto_recording():
-    autorecord_flag = os.environ.get("AUTO_RECORD", "false")
-    return autorecord_flag.lower() == "true"
+async def webhook_responses(app):
+    """Set up the cache of the responses to the webhooks, None if disabled.
+
+    WEBHOOK_DEDUPE_TTL is how long responses are kept, 600 seconds by default,
+    0 disables it.
+    """
+    ttl = app["settings"].webhook_dedupe_ttl
+    app["webhook_responses"] = (
+        WebhookResponses(app["state"], ttl) if ttl > 0 else None
+    )
+
+
+def deduplicated(*key_params):
+    """Replay the response to the first delivery of the webhook to redeliveries.
+
+    A delivery is identified by the first of the key_params query parameters it
+    has. A delivery with none of them is always handled. A redelivery which is
+    still being handled by another process gets a 503, for Nexmo to retry it.
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def deduplicated_handler(request):
+            webhook_responses = request.app["webhook_responses"]
+            query = request.rel_url.query
+            key = next((query[param] for param in key_params if query.get(param)), None)
+            if webhook_responses is None or key is None:
+                return await handler(request)
+
+            async def handle():
+                response = await handler(request)
+                # Kept as JSON by the state backend.
+                body = base64.b64encode(response.body or b"").decode()
+                return response.status, dict(response.headers), body
+
+            try:
+                status, headers, body = await webhook_responses.get(
+                    f"{handler.__name__}:{key}", handle
+                )
+            except DeliveryInProgress as e:
+                print(e)
+                return web.Response(status=503)
+            return web.Response(
+                status=status, headers=headers, body=base64.b64decode(body)
+            )
+
+        return deduplicated_handler
+
+    return decorator
+
+
+async def ncco_templates(app):
+    """Serialize the NCCOs returned by the webhooks once, at startup.
+
+    Only the per-call fields are filled in by the webhooks.
+    """
+    settings = app["settings"]
+    greeting = f"You've reached the {settings.hotline_description}."
+    conversation_ncco = {
+        "action": "conversation",
+        "name": field("conversation_uuid"),
+        # "eventMethod": "POST",
+        "endOnExit": False,
+        "startOnEnter": False,
+    }
+
+    if settings.auto_record:
+        greeting = f"{greeting} This call is recorded."
+        conversation_ncco.update(
+            {"record": True, "eventUrl": [settings.recording_event_url]}
+        )
+
+    app["answer_call_nccos"] = [
+        NCCOTemplate(
+            [
+                {"action": "talk", "text": greeting},
+                dict(conversation_ncco, musicOnHoldUrl=[music_url]),
+            ],
+            app["dumps"],
+        )
+        for music_url in MUSIC_WHILE_YOU_WAIT
+    ]
+    app["answer_conference_call_ncco"] = NCCOTemplate(
+        [
+            {
+                "action": "talk",
+                "text": f"Hello {field('phone_number_owner')}, connecting you to {settings.hotline_description}.",
+            },
+            {
+                "action": "conversation",
+                "name": field("origin_conversation_uuid"),
+                "startOnEnter": True,
+                "endOnExit": True,
+            },
+        ],
+        app["dumps"],
+    )
 
 
 @routes.get("/webhook/answer/")
+@deduplicated("uuid", "conversation_uuid")
 async def answer_call(request):
     """Webhook event for answering incoming call to the hotline.
 
@@ -79,55 +423,52 @@ async def answer_call(request):
     - play music while the called is waiting to be connected
     - record the call (if environment variable is set)
 
-    Dial everyone on staff, adding them to the same conversation
+    Dial everyone on staff, adding them to the same conversation.
+    If OUTBOX_PATH is set, the calls are put in the outbox. Otherwise, if
+    DIAL_IN_BACKGROUND is set, the NCCO is returned right away and the staff
+    are dialed in a background task.
 
     """
     hotline_number = request.rel_url.query["to"]
     conversation_uuid = request.rel_url.query["conversation_uuid"].strip()
     call_uuid = request.rel_url.query["uuid"].strip()
-    greeting = f"You've reached the {get_hotline_description()}."
 
-    conversation_ncco = {
-        "action": "conversation",
-        "name": conversation_uuid,
-        # "eventMethod": "POST",
-        "musicOnHoldUrl": [random.choice(MUSIC_WHILE_YOU_WAIT)],
-        "endOnExit": False,
-        "startOnEnter": False,
-    }
+    # One template per music while you wait.
+    ncco = random.choice(request.app["answer_call_nccos"]).render(
+        conversation_uuid=conversation_uuid
+    )
 
-    # print(conversation_uuid)
+    conversations = request.app["conversations"]
+    conversation = await conversations.start(conversation_uuid, call_uuid)
+    client = request.app["nexmo_client"]
+    phone_numbers = request.app["roster_source"].roster
+    answer_url = f"http://{request.host}/webhook/answer_conference_call/{conversation_uuid}/{call_uuid}/"
 
-    if is_auto_recording():
-        greeting = f"{greeting} This call is recorded."
-        conversation_ncco.update(
-            {
-                "record": True,
-                "eventUrl": [
-                    os.environ.get("ZAPIER_CATCH_HOOK_RECORDING_FINISHED_URL")
-                ],
-            }
+    if request.app["outbox"] is not None:
+        await request.app["outbox"].enqueue(
+            "create_call", get_staff_calls(phone_numbers, hotline_number, answer_url)
         )
-
-    ncco = [{"action": "talk", "text": greeting}, conversation_ncco]
-
-    client = get_nexmo_client()
-    phone_numbers = get_phone_numbers()
-
-    for phone_number_dict in phone_numbers:
-        # print(phone_number_dict)
-        client.create_call(
-            {
-                "to": [{"type": "phone", "number": phone_number_dict["phone"]}],
-                "from": {"type": "phone", "number": hotline_number},
-                "answer_url": [
-                    f"http://{request.host}/webhook/answer_conference_call/{conversation_uuid}/{call_uuid}/"
-                ],
-                "machine_detection": "hangup",
-            }
+        return web.Response(body=ncco, content_type="application/json")
+
+    async def on_call(staff_call_uuid):
+        # Recorded as soon as it's placed, to be hung up once a staff answers.
+        await conversations.add_staff_call(conversation, staff_call_uuid)
+        # A staff answered while this call was being placed.
+        latest = await conversations.get(conversation_uuid)
+        if latest.answered_at is not None and latest.answered_call != staff_call_uuid:
+            await hang_up_calls(client, [staff_call_uuid])
+
+    async def dial_out():
+        await dial_staff(client, phone_numbers, hotline_number, answer_url, on_call)
+
+    if request.app["settings"].dial_in_background:
+        spawn_background_task(
+            request.app, dial_out(), f"dialing staff for {conversation_uuid}"
         )
+    else:
+        await dial_out()
 
-    return web.json_response(ncco)
+    return web.Response(body=ncco, content_type="application/json")
 
 
 @routes.get(
@@ -136,7 +477,8 @@ async def answer_call(request):
 async def answer_conference_call(request):
     """Webhook event when a conference staff answered the conference call.
 
-    Notify the original caller that a staff is answering the call.
+    Notify the original caller that a staff is answering the call, and hang up
+    the calls to the rest of the staff.
 
     Return the NCCO:
     - talk: indicate that they're being connected to the PyCascades Hotline
@@ -146,11 +488,30 @@ async def answer_conference_call(request):
     origin_conversation_uuid = request.match_info["origin_conversation_uuid"]
     origin_call_uuid = request.match_info["origin_call_uuid"]
 
-    phone_number_owner = get_phone_number_owner(to_phone_number)
-    client = get_nexmo_client()
+    phone_number_owner = request.app["roster_source"].roster.owner(to_phone_number)
+    client = request.app["nexmo_client"]
+
+    conversations = request.app["conversations"]
+    conversation = await conversations.get(origin_conversation_uuid)
+    staff_call_uuid = request.rel_url.query.get("uuid")
+    # Only the first staff to answer hangs up the calls to the others.
+    if conversation is not None and await conversations.join(
+        conversation, phone_number_owner, staff_call_uuid
+    ):
+        # The calls placed so far, the others are hung up as they are placed.
+        conversation = await conversations.get(origin_conversation_uuid)
+        other_calls = [
+            uuid for uuid in conversation.staff_calls if uuid != staff_call_uuid
+        ]
+        if other_calls:
+            spawn_background_task(
+                request.app,
+                hang_up_calls(client, other_calls),
+                f"hanging up the other staff calls for {origin_conversation_uuid}",
+            )
 
     try:
-        response = client.send_speech(
+        response = await client.send_speech(
             origin_call_uuid, text=f"{phone_number_owner} is joining this call."
         )
     except nexmo.Error as er:  # pragma: no cover
@@ -162,60 +523,93 @@ async def answer_conference_call(request):
     else:
         print(f"Successfully notified caller. {response}")
 
-    ncco = [
-        {
-            "action": "talk",
-            "text": f"Hello {phone_number_owner}, connecting you to {get_hotline_description()}.",
-        },
-        {
-            "action": "conversation",
-            "name": origin_conversation_uuid,
-            "startOnEnter": True,
-            "endOnExit": True,
-        },
-    ]
+    ncco = request.app["answer_conference_call_ncco"].render(
+        phone_number_owner=phone_number_owner,
+        origin_conversation_uuid=origin_conversation_uuid,
+    )
 
-    return web.json_response(ncco)
+    return web.Response(body=ncco, content_type="application/json")
 
 
 @routes.get("/webhook/inbound-sms/")
+@deduplicated("messageId")
 async def inbound_sms(request):
     """Webhook event that receives and inbound SMS messages and notifies all
     staff.
 
-    It also sends the sender an acknowledgment.
+    It also sends the sender an acknowledgment. The messages are sent after
+    responding, from the outbox if OUTBOX_PATH is set.
 
     This should be configured in Nexmo to send using GET.
     """
     hotline_number = request.rel_url.query["to"]
     from_number = request.rel_url.query["msisdn"]
     message = request.rel_url.query["text"]
+    settings = request.app["settings"]
 
-    client = get_nexmo_client()
-    phone_numbers = get_phone_numbers()
-
-    for phone_number_dict in phone_numbers:
-        client.send_message(
-            {
-                # Send from the number the received this message.
-                "from": hotline_number,
-                "to": phone_number_dict["phone"],
-                "text": f"{from_number}: {message}",
-            }
-        )
-
+    messages = [
+        {
+            # Send from the number the received this message.
+            "from": hotline_number,
+            "to": phone_number_dict["phone"],
+            "text": f"{from_number}: {message}",
+        }
+        for phone_number_dict in request.app["roster_source"].roster
+    ]
     # Reply to the sender and acknowledge receipt.
-    client.send_message(
+    messages.append(
         {
             "from": hotline_number,
             "to": from_number,
-            "text": f"Thanks for contacting the {get_hotline_description()}. Someone should follow-up shortly. Note: they may follow up from a different number.",
+            "text": f"Thanks for contacting the {settings.hotline_description}. Someone should follow-up shortly. Note: they may follow up from a different number.",
         }
     )
 
+    if request.app["outbox"] is not None:
+        await request.app["outbox"].enqueue("send_message", messages)
+        return web.Response(status=204)
+
+    # Respond right away, so Nexmo doesn't time out and deliver the SMS again.
+    spawn_background_task(
+        request.app,
+        send_messages(
+            request.app["nexmo_client"], messages, settings.sms_concurrency
+        ),
+        f"sending SMS from {from_number}",
+    )
+
     return web.Response(status=204)
 
 
+def get_recording_response_headers(upstream):
+    """Return the headers of the upstream recording response to pass through"""
+    return {
+        name: upstream.headers[name]
+        for name in RECORDING_RESPONSE_HEADERS
+        if name in upstream.headers
+    }
+
+
+async def stream_recording(request, upstream, chunks):
+    """Stream the recording chunks to the client.
+
+    The response has the status and headers of the upstream response.
+    """
+    response = web.StreamResponse(
+        status=upstream.status, headers=get_recording_response_headers(upstream)
+    )
+    response.content_type = "audio/mpeg"
+    if upstream.content_length is not None:
+        response.content_length = upstream.content_length
+    await response.prepare(request)
+
+    async for chunk in chunks:
+        await response.write(chunk)
+
+    await response.write_eof()
+    return response
+
+
 @routes.get("/recordings/")
 async def proxy_recording(request):
     """Endpoint for proxying Nexmo recording downloads.
@@ -224,11 +618,21 @@ async def proxy_recording(request):
 
     api_key and api_secret must be provided as GET parameters so we can authenticate
     this request.
+
+    The recording is streamed to the client as it is downloaded, it is never
+    held in memory as a whole. Range and conditional requests are forwarded to
+    Nexmo, so partial (206) and not modified (304) responses are passed through.
+
+    Concurrent requests for the same recording share a single download from
+    Nexmo. If the recording cache is enabled, recordings are downloaded once
+    and then served from disk. The first download is streamed to the client
+    while it's written to the cache.
     """
     recording_url = request.rel_url.query["recording_url"]
 
-    api_key = os.environ.get("NEXMO_API_KEY")
-    api_secret = os.environ.get("NEXMO_API_SECRET")
+    settings = request.app["settings"]
+    api_key = settings.nexmo_api_key
+    api_secret = settings.nexmo_api_secret
 
     incoming_api_key = request.rel_url.query["api_key"]
     incoming_api_secret = request.rel_url.query["api_secret"]
@@ -236,19 +640,138 @@ async def proxy_recording(request):
     if api_key != incoming_api_key or api_secret != incoming_api_secret:
         return web.Response(status=401)
 
-    client = get_nexmo_client()
+    client = request.app["nexmo_client"]
+
+    cache = request.app["recording_cache"]
+    if cache is not None:
+        path = await cache.lookup(recording_key(recording_url))
+        if path is not None:
+            return web.FileResponse(path, chunk_size=RECORDING_CHUNK_SIZE)
+
+    headers = {
+        name: request.headers[name]
+        for name in RECORDING_REQUEST_HEADERS
+        if name in request.headers
+    }
+    if headers:
+        async with await client.open_recording(recording_url, headers) as upstream:
+            if upstream.status == 304:
+                return web.Response(
+                    status=304, headers=get_recording_response_headers(upstream)
+                )
+            return await stream_recording(
+                request, upstream, upstream.content.iter_chunked(RECORDING_CHUNK_SIZE)
+            )
+
+    # Concurrent requests for the whole recording share one download.
+    if cache is not None:
+        download = cache.join(
+            recording_key(recording_url), lambda: client.open_recording(recording_url)
+        )
+    else:
+        download = request.app["recording_downloads"].join(
+            recording_url, lambda: client.open_recording(recording_url)
+        )
+    try:
+        upstream = await download.response
+        return await stream_recording(request, upstream, download.read())
+    finally:
+        download.leave()
+
+
+def json_response(request, data):
+    """Return a JSON response, encoded with the JSON encoder of the app"""
     return web.Response(
-        body=client.get_recording(recording_url), content_type="audio/mpeg"
+        body=request.app["dumps"](data), content_type="application/json"
     )
 
 
-if __name__ == "__main__":  # pragma: no cover
+@routes.get("/status/")
+async def status(request):
+    """Return statistics about the webservice, e.g. the thread pool queue depth"""
+    return json_response(
+        request,
+        {
+            "executor": request.app["executor"].stats(),
+            "conversations": await request.app["conversations"].count(),
+        },
+    )
+
+
+@routes.get("/health/")
+async def health(request):
+    """Return the health of the worker process handling the request"""
+    app = request.app
+    return json_response(
+        request,
+        {
+            "status": "ok",
+            "worker": app["worker_id"],
+            "pid": os.getpid(),
+            "uptime": time.monotonic() - app["started_at"],
+            "background_tasks": len(app["background_tasks"]),
+        },
+    )
+
+
+def create_app():
+    """Return the hotline web application"""
     app = web.Application()
     app.router.add_routes(routes)
-
+    app["background_tasks"] = set()
+    app["started_at"] = time.monotonic()
+    # Set when running in a worker process, see webservice.workers.
+    app["worker_id"] = None
+    app.cleanup_ctx.append(settings)
+    app.cleanup_ctx.append(executor)
+    app.cleanup_ctx.append(state)
+    app.cleanup_ctx.append(roster_source)
+    app.cleanup_ctx.append(nexmo_session)
+    app.cleanup_ctx.append(outbox)
+    app.on_startup.append(webhook_responses)
+    app.on_startup.append(ncco_templates)
+    app.cleanup_ctx.append(recording_downloads)
+    app.cleanup_ctx.append(recording_cache)
+    app.on_shutdown.append(cancel_background_tasks)
+    return app
+
+
+def main():  # pragma: no cover
+    """Run the webservice, in worker processes if WEB_CONCURRENCY is over 1"""
     port = os.environ.get("PORT")
 
     if port is not None:
         port = int(port)
 
-    web.run_app(app, port=port)
+    if os.environ.get("USE_UVLOOP", "false").lower() == "true":
+        install_uvloop()
+
+    if is_worker():
+        run_worker(create_app())
+        return
+
+    try:
+        settings = Settings.from_environ()
+    except SettingsError as error:
+        print(error)
+        sys.exit(1)
+
+    # Number of worker processes, as set by Heroku for the size of the dyno.
+    web_concurrency = settings.web_concurrency
+    if web_concurrency > 1 and not settings.state_path:
+        # Each worker would keep its own state, unknown to the others.
+        print(
+            f"WEB_CONCURRENCY is {web_concurrency} but STATE_PATH isn't set, "
+            "running a single worker"
+        )
+        web_concurrency = 1
+
+    if web_concurrency > 1:
+        sock = listen(port or 8080)
+        sys.exit(Supervisor(sock, web_concurrency).run())
+    else:
+        web.run_app(create_app(), port=port)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
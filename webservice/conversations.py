@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+
+class Conversation:
+    """A call to the hotline, and the calls to the staff it started.
+
+    Times are read from ``time.time()``.
+    """
+
+    __slots__ = (
+        "uuid",
+        "origin_call_uuid",
+        "staff_calls",
+        "joined",
+        "started_at",
+        "answered_at",
+        "answered_call",
+    )
+
+    def __init__(
+        self,
+        uuid,
+        origin_call_uuid,
+        started_at,
+        staff_calls=None,
+        joined=None,
+        answered_at=None,
+        answered_call=None,
+    ):
+        self.uuid = uuid
+        self.origin_call_uuid = origin_call_uuid
+        # UUIDs of the calls placed to the staff.
+        self.staff_calls = staff_calls or []
+        # Names of the staff who joined, in order.
+        self.joined = joined or []
+        self.started_at = started_at
+        self.answered_at = answered_at
+        # UUID of the staff call which answered first.
+        self.answered_call = answered_call
+
+
+class Conversations:
+    """The conversations in progress, by conversation UUID.
+
+    Conversations are kept in the state backend, see webservice.state, and are
+    forgotten ttl seconds after they started. Each change is written to its own
+    key, so changes made at the same time, e.g. by a staff joining while the
+    others are being dialed, or by other processes, aren't lost.
+    """
+
+    def __init__(self, state, ttl):
+        self.state = state
+        self.ttl = ttl
+
+    def _ttl(self, conversation):
+        return conversation.started_at + self.ttl - time.time()
+
+    async def start(self, uuid, origin_call_uuid):
+        """Return the conversation, registering it if it's new"""
+        await self.state.add(
+            f"conversation:{uuid}",
+            {"origin_call_uuid": origin_call_uuid, "started_at": time.time()},
+            self.ttl,
+        )
+        return await self.get(uuid)
+
+    async def get(self, uuid):
+        """Return the conversation, or None if it's unknown or was forgotten"""
+        conversation = await self.state.get(f"conversation:{uuid}")
+        if conversation is None:
+            return None
+        staff_calls, joined, answered = await asyncio.gather(
+            self.state.get(f"staff_calls:{uuid}"),
+            self.state.get(f"joined:{uuid}"),
+            self.state.get(f"answered:{uuid}"),
+        )
+        return Conversation(
+            uuid,
+            conversation["origin_call_uuid"],
+            conversation["started_at"],
+            staff_calls=staff_calls,
+            joined=joined,
+            answered_at=answered and answered["at"],
+            answered_call=answered and answered["call_uuid"],
+        )
+
+    async def add_staff_call(self, conversation, call_uuid):
+        """Record the call placed to a staff for the conversation"""
+        await self.state.append(
+            f"staff_calls:{conversation.uuid}", call_uuid, self._ttl(conversation)
+        )
+        conversation.staff_calls.append(call_uuid)
+
+    async def join(self, conversation, name, call_uuid=None):
+        """Record that the staff joined the conversation, on the call call_uuid.
+
+        Return whether they are the first to join, of all the processes sharing
+        the state backend.
+        """
+        ttl = self._ttl(conversation)
+        answered_at = time.time()
+        first = await self.state.add(
+            f"answered:{conversation.uuid}",
+            {"name": name, "call_uuid": call_uuid, "at": answered_at},
+            ttl,
+        )
+        await self.state.append(f"joined:{conversation.uuid}", name, ttl)
+        if first:
+            conversation.answered_at = answered_at
+            conversation.answered_call = call_uuid
+        conversation.joined.append(name)
+        return first
+
+    async def count(self):
+        """Return the number of conversations in progress"""
+        return await self.state.count("conversation:")
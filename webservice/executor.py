@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Executor(ThreadPoolExecutor):
+    """Thread pool for the blocking work of the webservice.
+
+    Keeps count of the work waiting for a thread, running and completed, so the
+    pool can be sized from its queue depth.
+    """
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers, thread_name_prefix="webservice")
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._stats_lock:
+            self.queued += 1
+
+        def run():
+            with self._stats_lock:
+                self.queued -= 1
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return super().submit(run)
+
+    def stats(self):
+        """Return the size of the pool, and the number of tasks by state"""
+        with self._stats_lock:
+            return {
+                "max_workers": self._max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+            }
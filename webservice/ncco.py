@@ -0,0 +1,38 @@
+import json
+import re
+
+from webservice.speedups import json_dumps
+
+FIELD_RE = re.compile(rb"\\ue000(\w+)\\ue001")
+
+
+def field(name):
+    """Return the placeholder of the field name, to fill in with render()"""
+    return f"\ue000{name}\ue001"
+
+
+class NCCOTemplate:
+    """An NCCO serialized to JSON once, with the per-call fields left to fill in.
+
+    Fields are placeholders returned by field(), in strings of the NCCO, e.g:
+    ``{"action": "conversation", "name": field("conversation_uuid")}``.
+    Their values are encoded with dumps, which returns JSON bytes.
+    """
+
+    __slots__ = ("_segments", "_fields", "_dumps")
+
+    def __init__(self, ncco, dumps=json_dumps):
+        self._dumps = dumps
+        # Serialized with the standard library, which escapes the placeholders.
+        parts = FIELD_RE.split(json.dumps(ncco).encode())
+        self._segments = parts[0::2]
+        self._fields = [name.decode() for name in parts[1::2]]
+
+    def render(self, **values):
+        """Return the NCCO JSON, with the fields set to the values, as strings"""
+        body = [self._segments[0]]
+        for name, segment in zip(self._fields, self._segments[1:]):
+            # The value is escaped as the content of a JSON string.
+            body.append(self._dumps(str(values[name]))[1:-1])
+            body.append(segment)
+        return b"".join(body)
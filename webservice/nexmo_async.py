@@ -0,0 +1,157 @@
+import aiohttp
+import nexmo
+
+# Base URLs of the Nexmo APIs. Voice calls use API_URL, SMS use REST_URL.
+API_URL = "https://api.nexmo.com"
+REST_URL = "https://rest.nexmo.com"
+
+# Seconds an API call may take, well under the lease of the outbox messages,
+# so a slow call isn't sent again by another worker while it's in progress.
+REQUEST_TIMEOUT = 20.0
+
+# Recordings can be an hour long, a download isn't limited in total, only in the
+# seconds to connect and to wait for the next data.
+RECORDING_CONNECT_TIMEOUT = REQUEST_TIMEOUT
+RECORDING_READ_TIMEOUT = 60.0
+
+
+class Client:
+    """asyncio version of the parts of the Nexmo client library used by the hotline.
+
+    Methods take the same parameters, return the same values and raise the same
+    ``nexmo.Error`` subclasses as their ``nexmo.Client`` counterparts.
+
+    API calls are made on a shared aiohttp session. The session is expected to
+    be long-lived, so connections to Nexmo are kept alive and reused between
+    requests. Authentication is delegated to a ``webservice.nexmo_client.Client``,
+    which provides the API key and secret and the signed JWT.
+
+    API calls raise ``asyncio.TimeoutError`` after REQUEST_TIMEOUT seconds.
+    Recording downloads only raise it if connecting takes more than
+    RECORDING_CONNECT_TIMEOUT seconds, or no data arrives for
+    RECORDING_READ_TIMEOUT seconds.
+    """
+
+    def __init__(self, session, client, api_url=None, rest_url=None):
+        self.session = session
+        self.client = client
+        self.api_url = api_url or API_URL
+        self.rest_url = rest_url or REST_URL
+
+    def _recording_timeout(self):
+        return aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=RECORDING_CONNECT_TIMEOUT,
+            sock_read=RECORDING_READ_TIMEOUT,
+        )
+
+    def _jwt_headers(self):
+        token = self.client.generate_application_jwt()
+        if isinstance(token, bytes):
+            token = token.decode()
+        return dict(self.client.headers, Authorization=f"Bearer {token}")
+
+    async def _parse(self, response):
+        host = response.url.host
+        if response.status == 401:
+            raise nexmo.AuthenticationError
+        elif response.status == 204:
+            return None
+        elif 200 <= response.status < 300:
+            if response.content_type == "application/json":
+                return await response.json()
+            else:
+                return await response.read()
+        elif 400 <= response.status < 500:
+            message = f"{response.status} response from {host}"
+            try:
+                error_data = await response.json(content_type=None)
+            except ValueError:
+                pass
+            else:
+                if (
+                    isinstance(error_data, dict)
+                    and "type" in error_data
+                    and "title" in error_data
+                    and "detail" in error_data
+                ):
+                    message = "{title}: {detail} ({type})".format(**error_data)
+            raise nexmo.ClientError(message)
+        else:
+            raise nexmo.ServerError(f"{response.status} response from {host}")
+
+    async def _jwt_signed_request(self, method, request_uri, params=None):
+        async with self.session.request(
+            method,
+            self.api_url + request_uri,
+            json=params,
+            headers=self._jwt_headers(),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        ) as response:
+            return await self._parse(response)
+
+    async def create_call(self, params=None, **kwargs):
+        """Create an outbound call, see ``nexmo.Client.create_call``"""
+        return await self._jwt_signed_request("POST", "/v1/calls", params or kwargs)
+
+    async def update_call(self, uuid, params=None, **kwargs):
+        """Modify a call in progress, see ``nexmo.Client.update_call``"""
+        return await self._jwt_signed_request(
+            "PUT", f"/v1/calls/{uuid}", params or kwargs
+        )
+
+    async def send_speech(self, uuid, params=None, **kwargs):
+        """Play text-to-speech into a call, see ``nexmo.Client.send_speech``"""
+        return await self._jwt_signed_request(
+            "PUT", f"/v1/calls/{uuid}/talk", params or kwargs
+        )
+
+    async def send_message(self, params):
+        """Send an SMS, see ``nexmo.Client.send_message``"""
+        data = dict(
+            params, api_key=self.client.api_key, api_secret=self.client.api_secret
+        )
+        async with self.session.post(
+            self.rest_url + "/sms/json",
+            data=data,
+            headers=self.client.headers,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        ) as response:
+            return await self._parse(response)
+
+    async def get_recording(self, url):
+        """Return the content of a recording, see ``nexmo.Client.get_recording``"""
+        async with self.session.get(
+            url, headers=self._jwt_headers(), timeout=self._recording_timeout()
+        ) as response:
+            return await self._parse(response)
+
+    async def open_recording(self, url, headers=None):
+        """Return the response for a recording, to read its content as it arrives.
+
+        headers are added to the request, e.g. Range or If-None-Match. Responses
+        to those, 304 Not Modified and 416 Range Not Satisfiable, are returned
+        as they are. Otherwise raises like get_recording if the recording can't
+        be downloaded.
+
+        The caller must release the response, e.g. with ``async with response``.
+        """
+        response = await self.session.get(
+            url,
+            headers=dict(self._jwt_headers(), **(headers or {})),
+            timeout=self._recording_timeout(),
+        )
+        if not 200 <= response.status < 300 and response.status not in (304, 416):
+            async with response:
+                await self._parse(response)
+        return response
+
+
+def create_session(limit, limit_per_host):
+    """Return an aiohttp session with a keep-alive connection pool
+
+    limit is the total number of connections in the pool, limit_per_host the
+    number of connections to the same host. 0 means no limit.
+    """
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    return aiohttp.ClientSession(connector=connector)
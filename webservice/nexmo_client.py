@@ -0,0 +1,61 @@
+import threading
+import time
+from uuid import uuid4
+
+import jwt
+import nexmo
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+
+# How long a generated JWT is valid for, in seconds.
+JWT_LIFETIME = 15 * 60
+
+# Generate a new JWT when the current one expires within this many seconds.
+JWT_REFRESH_MARGIN = 60
+
+
+class Client(nexmo.Client):
+    """Nexmo client meant to be shared for the lifetime of the process.
+
+    The private key is parsed once, and the signed JWT is reused for every
+    request until it is about to expire. It is safe to use from several threads.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._signing_key = None
+        self._token = None
+        self._token_expiry = 0
+
+    def _get_signing_key(self):
+        if self._signing_key is None:
+            private_key = self.private_key
+            if isinstance(private_key, str):
+                private_key = private_key.encode()
+            self._signing_key = serialization.load_pem_private_key(
+                private_key, password=None, backend=default_backend()
+            )
+        return self._signing_key
+
+    def generate_application_jwt(self, when=None):
+        """Return a JWT for this application, reusing the cached one if still valid"""
+        if when is not None:
+            return super().generate_application_jwt(when)
+
+        now = time.time()
+        with self._lock:
+            if self._token is None or now >= self._token_expiry - JWT_REFRESH_MARGIN:
+                iat = int(now)
+                payload = dict(self.auth_params)
+                payload.setdefault("application_id", self.application_id)
+                payload.setdefault("iat", iat)
+                payload.setdefault("exp", iat + JWT_LIFETIME)
+                payload.setdefault("jti", str(uuid4()))
+
+                token = jwt.encode(payload, self._get_signing_key(), algorithm="RS256")
+                if isinstance(token, str):
+                    token = token.encode()
+                self._token = token
+                self._token_expiry = payload["exp"]
+            return self._token
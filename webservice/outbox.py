@@ -0,0 +1,191 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+import nexmo
+
+
+class Outbox:
+    """Outbound SMS messages and calls waiting to be sent, kept in a SQLite database.
+
+    Messages are put in the outbox by the webhooks, and sent to Nexmo by worker
+    coroutines running deliver(). A message is sent by calling the method of
+    the ``nexmo_async.Client`` it was put with, e.g: "send_message", with its
+    parameters.
+
+    A message which fails to send is retried later, with an exponential
+    backoff. After max_attempts, or if Nexmo rejects it as invalid, it is moved
+    to the dead_letters table. Authentication failures, e.g. because of wrong
+    credentials or clock, are retried until they are fixed. A message being
+    sent is leased for lease seconds, if the webservice stops before it is
+    sent, it is sent again once the lease expires. It must be longer than
+    ``nexmo_async.REQUEST_TIMEOUT``.
+
+    The database is accessed on executor, the loop's default executor if None.
+    """
+
+    def __init__(
+        self,
+        path,
+        executor=None,
+        max_attempts=5,
+        backoff=1.0,
+        max_backoff=300.0,
+        lease=60.0,
+        poll_interval=1.0,
+    ):
+        self.executor = executor
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # The journal is kept in a separate file, so a write doesn't block reads.
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT
+                )
+                """
+            )
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error TEXT NOT NULL,
+                    failed_at REAL NOT NULL
+                )
+                """
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS messages_next_attempt_at "
+                "ON messages (next_attempt_at)"
+            )
+
+    def put(self, method, params_list):
+        """Add a message to send with method for each of the params"""
+        now = time.time()
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT INTO messages (method, params, next_attempt_at) "
+                "VALUES (?, ?, ?)",
+                [(method, json.dumps(params), now) for params in params_list],
+            )
+
+    def claim(self):
+        """Lease the next message due, return its id, method, params and attempts.
+
+        Return None if no message is due.
+        """
+        now = time.time()
+        with self._lock, self.db:
+            row = self.db.execute(
+                "SELECT id, method, params, attempts FROM messages "
+                "WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            message_id, method, params, attempts = row
+            self.db.execute(
+                "UPDATE messages SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+                (attempts + 1, now + self.lease, message_id),
+            )
+        return message_id, method, json.loads(params), attempts + 1
+
+    def complete(self, message_id):
+        """Remove the message, it was sent"""
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+
+    def retry(self, message_id, error, delay):
+        """Send the message again in delay seconds"""
+        with self._lock, self.db:
+            self.db.execute(
+                "UPDATE messages SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, str(error), message_id),
+            )
+
+    def bury(self, message_id, error):
+        """Move the message to the dead letters, it won't be sent"""
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT INTO dead_letters "
+                "SELECT id, method, params, attempts, ?, ? FROM messages WHERE id = ?",
+                (str(error), time.time(), message_id),
+            )
+            self.db.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+
+    def dead_letters(self):
+        """Return the method, params and error of the messages which weren't sent"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT method, params, error FROM dead_letters ORDER BY id"
+            ).fetchall()
+        return [(method, json.loads(params), error) for method, params, error in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    async def enqueue(self, method, params_list):
+        """Put the messages in the outbox, and wake up the workers"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.executor, self.put, method, params_list)
+        self._wakeup.set()
+
+    async def deliver(self, client):
+        """Send the messages in the outbox with the client, until cancelled"""
+        loop = asyncio.get_event_loop()
+        while True:
+            self._wakeup.clear()
+            message = await loop.run_in_executor(self.executor, self.claim)
+            if message is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            message_id, method, params, attempts = message
+            try:
+                await getattr(client, method)(params)
+            except Exception as e:
+                if isinstance(e, nexmo.AuthenticationError):
+                    # Not the message's fault, it's sent once it's fixed.
+                    give_up = False
+                else:
+                    # Nexmo would reject the message again.
+                    give_up = (
+                        isinstance(e, nexmo.ClientError)
+                        or attempts >= self.max_attempts
+                    )
+                if give_up:
+                    print(f"error sending {method} to {params.get('to')}, giving up")
+                    print(e)
+                    await loop.run_in_executor(self.executor, self.bury, message_id, e)
+                else:
+                    delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                    await loop.run_in_executor(
+                        self.executor, self.retry, message_id, e, delay
+                    )
+            else:
+                await loop.run_in_executor(self.executor, self.complete, message_id)
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import os
+import re
+from urllib.parse import urlsplit
+
+from webservice.shared_download import SharedDownloads
+
+RECORDING_UUID_RE = re.compile(r"^[0-9A-Za-z-]+$")
+
+
+def recording_key(recording_url):
+    """Return the key to cache the recording under: its UUID.
+
+    Nexmo recording URLs end with the recording UUID, e.g:
+    https://api.nexmo.com/v1/files/aaaaaaaa-bbbb-cccc-dddd-0123456789ab
+    Other URLs are keyed by their hash.
+    """
+    url = urlsplit(recording_url)
+    uuid = url.path.rstrip("/").rsplit("/", 1)[-1]
+    if not url.query and RECORDING_UUID_RE.match(uuid):
+        return uuid
+    return hashlib.sha256(recording_url.encode()).hexdigest()
+
+
+class RecordingCache:
+    """Recordings kept on disk, up to max_size bytes.
+
+    When the cache is full, the least recently used recordings are removed.
+    A recording which isn't cached yet is streamed to the readers while it's
+    written to a temporary file, which is moved into the cache once complete,
+    so a recording in the cache is always complete. Concurrent requests for it
+    share one download, see webservice.shared_download.
+
+    Disk access runs on executor, the loop's default executor if None.
+    """
+
+    def __init__(self, directory, max_size, chunk_size, executor=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.executor = executor
+        self._downloads = SharedDownloads(chunk_size, executor, directory, self.store)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _lookup(self, key):
+        path = self.path(key)
+        try:
+            # The modification time records when the recording was last used.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def lookup(self, key):
+        """Return the path to the cached recording, None if it isn't cached"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._lookup, key)
+
+    def join(self, key, open_upstream):
+        """Return the download caching the recording, starting it if needed.
+
+        ``await open_upstream()`` must return the upstream aiohttp response. The
+        caller must call leave() on the download when it's done reading.
+        """
+        return self._downloads.join(key, open_upstream)
+
+    def store(self, key, temp_path):
+        """Move the downloaded recording at temp_path into the cache"""
+        path = self.path(key)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+
+    async def close(self):
+        """Cancel the downloads in progress"""
+        await self._downloads.close()
+
+    def evict(self, keep=None):
+        """Remove the least recently used recordings until the cache fits in max_size
+
+        The recording at the path keep is never removed.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".mp3"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover
+    yaml = None
+
+
+def normalize_phone_number(phone_number):
+    """Return the phone number in E.164 format, without the leading +
+
+    This is the format Nexmo uses in its webhooks, e.g: 16040001234
+    """
+    return "".join(char for char in str(phone_number) if char.isdigit())
+
+
+class Roster:
+    """The staff to notify, indexed by phone number.
+
+    Iterating over the roster gives the phone number dictionaries, in the order
+    they were configured.
+    """
+
+    __slots__ = ("phone_numbers", "_owners")
+
+    def __init__(self, phone_numbers):
+        self.phone_numbers = tuple(phone_numbers)
+        self._owners = {
+            normalize_phone_number(phone_number_info["phone"]): phone_number_info[
+                "name"
+            ]
+            for phone_number_info in self.phone_numbers
+        }
+
+    def __iter__(self):
+        return iter(self.phone_numbers)
+
+    def __len__(self):
+        return len(self.phone_numbers)
+
+    def owner(self, phone_number):
+        """Return the name of the owner of the phone number, or None"""
+        return self._owners.get(normalize_phone_number(phone_number))
+
+
+def load_phone_numbers(path):
+    """Return the staff names and phone numbers from a JSON or YAML file"""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError(f"PyYAML is required to read {path}")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class RosterSource:
+    """Holds the current roster.
+
+    Requests should read ``roster`` once and use that roster until they are
+    done, it may be swapped for a new one at any time.
+    """
+
+    def __init__(self, roster):
+        self.roster = roster
+
+
+class RosterFile(RosterSource):
+    """Roster read from a JSON or YAML file, and reloaded when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._stat = self._get_stat()
+        super().__init__(Roster(load_phone_numbers(path)))
+
+    def _get_stat(self):
+        stat = os.stat(self.path)
+        # The inode changes when the file is replaced by renaming another one.
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def reload(self):
+        """Load the roster again if the file changed since it was last loaded.
+
+        Return whether the roster was replaced. If the file can't be read, the
+        current roster is kept.
+        """
+        try:
+            stat = self._get_stat()
+            if stat == self._stat:
+                return False
+            roster = Roster(load_phone_numbers(self.path))
+        except Exception as e:
+            print(f"error reloading the roster from {self.path}")
+            print(e)
+            return False
+
+        self.roster = roster
+        self._stat = stat
+        print(f"Reloaded the roster from {self.path}, {len(roster)} staff.")
+        return True
+
+    async def watch(self, interval, executor=None):
+        """Check the file for changes every interval seconds, until cancelled
+
+        The file is read on executor, the loop's default executor if None.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(executor, self.reload)
@@ -0,0 +1,149 @@
+import json
+import math
+import os
+
+from webservice.speedups import JSON_ENCODERS
+
+
+class SettingsError(Exception):
+    """Environment variables are missing or invalid"""
+
+
+class Settings:
+    """The configuration of the webservice, read from the environment once.
+
+    Settings are read-only. from_environ() reports every missing or invalid
+    environment variable at once, so the webservice fails when it starts
+    instead of when a call comes in.
+    """
+
+    __slots__ = (
+        "nexmo_api_key",
+        "nexmo_api_secret",
+        "nexmo_app_id",
+        "nexmo_private_key",
+        "hotline_description",
+        "phone_numbers",
+        "phone_numbers_file",
+        "phone_numbers_poll_interval",
+        "auto_record",
+        "recording_event_url",
+        "dial_in_background",
+        "sms_concurrency",
+        "webhook_dedupe_ttl",
+        "nexmo_pool_size",
+        "nexmo_pool_size_per_host",
+        "blocking_pool_size",
+        "outbox_path",
+        "state_path",
+        "outbox_workers",
+        "outbox_max_attempts",
+        "recording_cache_dir",
+        "recording_cache_size",
+        "json_encoder",
+        "web_concurrency",
+    )
+
+    def __init__(self, **settings):
+        for name in self.__slots__:
+            object.__setattr__(self, name, settings.pop(name))
+        if settings:
+            raise TypeError(f"unknown settings: {', '.join(settings)}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("settings are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("settings are read-only")
+
+    @classmethod
+    def from_environ(cls, environ=None):
+        """Return the settings from the environment variables.
+
+        Raise SettingsError listing the variables which are missing or invalid.
+        """
+        if environ is None:
+            environ = os.environ
+        missing = []
+        invalid = []
+
+        def required(name):
+            value = environ.get(name)
+            if not value:
+                missing.append(name)
+            return value
+
+        def flag(name):
+            return environ.get(name, "false").lower() == "true"
+
+        def number(name, default, minimum, type=int):
+            value = environ.get(name)
+            if not value:
+                return default
+            try:
+                number = type(value)
+            except ValueError:
+                number = None
+            # nan and inf would pass the minimum check, and break the arithmetic.
+            if number is None or not math.isfinite(number) or number < minimum:
+                invalid.append(f"{name} must be a number, at least {minimum}")
+                return default
+            return number
+
+        phone_numbers = None
+        phone_numbers_file = environ.get("PHONE_NUMBERS_FILE") or None
+        if not phone_numbers_file:
+            try:
+                phone_numbers = json.loads(required("PHONE_NUMBERS") or "[]")
+            except ValueError:
+                phone_numbers = None
+            if not isinstance(phone_numbers, list):
+                invalid.append("PHONE_NUMBERS must be a JSON list")
+
+        json_encoder = environ.get("JSON_ENCODER") or "json"
+        if json_encoder not in JSON_ENCODERS:
+            encoders = ", ".join(JSON_ENCODERS)
+            invalid.append(f"JSON_ENCODER must be one of: {encoders}")
+
+        auto_record = flag("AUTO_RECORD")
+        recording_event_url = None
+        if auto_record:
+            recording_event_url = required("ZAPIER_CATCH_HOOK_RECORDING_FINISHED_URL")
+
+        settings = dict(
+            nexmo_api_key=required("NEXMO_API_KEY"),
+            nexmo_api_secret=required("NEXMO_API_SECRET"),
+            nexmo_app_id=required("NEXMO_APP_ID"),
+            nexmo_private_key=required("NEXMO_PRIVATE_KEY_VOICE_APP"),
+            hotline_description=required("HOTLINE_DESC"),
+            phone_numbers=phone_numbers,
+            phone_numbers_file=phone_numbers_file,
+            phone_numbers_poll_interval=number(
+                "PHONE_NUMBERS_POLL_INTERVAL", 5.0, 0, type=float
+            ),
+            auto_record=auto_record,
+            recording_event_url=recording_event_url,
+            dial_in_background=flag("DIAL_IN_BACKGROUND"),
+            sms_concurrency=number("SMS_CONCURRENCY", 10, 1),
+            webhook_dedupe_ttl=number("WEBHOOK_DEDUPE_TTL", 600.0, 0, type=float),
+            nexmo_pool_size=number("NEXMO_POOL_SIZE", 100, 0),
+            nexmo_pool_size_per_host=number("NEXMO_POOL_SIZE_PER_HOST", 0, 0),
+            blocking_pool_size=number("BLOCKING_POOL_SIZE", 10, 1),
+            outbox_path=environ.get("OUTBOX_PATH") or None,
+            state_path=environ.get("STATE_PATH") or None,
+            outbox_workers=number("OUTBOX_WORKERS", 4, 1),
+            outbox_max_attempts=number("OUTBOX_MAX_ATTEMPTS", 5, 1),
+            recording_cache_dir=environ.get("RECORDING_CACHE_DIR") or None,
+            recording_cache_size=number("RECORDING_CACHE_SIZE", 1024 ** 3, 0),
+            json_encoder=json_encoder,
+            web_concurrency=number("WEB_CONCURRENCY", 1, 1),
+        )
+
+        errors = []
+        if missing:
+            missing = ", ".join(sorted(missing))
+            errors.append(f"missing environment variables: {missing}")
+        errors.extend(invalid)
+        if errors:
+            raise SettingsError("; ".join(errors))
+        return cls(**settings)
@@ -0,0 +1,180 @@
+import asyncio
+import functools
+import os
+import tempfile
+
+
+class SharedDownload:
+    """A download which several requests stream from at the same time.
+
+    The content is spooled to a temporary file as it arrives from upstream, and
+    each reader streams it from there at its own pace, starting from the first
+    byte whenever it joined.
+
+    If store is given, the content is spooled to a file in directory instead,
+    and ``store(path)`` is called with its path once the download is complete,
+    to move it where it's kept. The file is removed if the download fails.
+
+    The temporary file is accessed on executor, the loop's default executor if
+    None.
+    """
+
+    def __init__(
+        self, open_upstream, chunk_size, executor=None, directory=None, store=None
+    ):
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.directory = directory
+        self.store = store
+        self.response = asyncio.get_event_loop().create_future()
+        self.size = 0
+        self.done = False
+        self.error = None
+        self.readers = 0
+        self._file = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._fetch(open_upstream))
+        self.task.add_done_callback(self._on_task_done)
+
+    def _open_file(self):
+        if self.store is None:
+            return tempfile.TemporaryFile()
+        return tempfile.NamedTemporaryFile(
+            dir=self.directory, suffix=".part", delete=False
+        )
+
+    def _store(self):
+        try:
+            self.store(self._file.name)
+        except Exception as e:
+            print(f"error storing the download {self._file.name}")
+            print(e)
+            self._discard()
+
+    def _discard(self):
+        try:
+            os.unlink(self._file.name)
+        except FileNotFoundError:
+            pass
+
+    async def _fetch(self, open_upstream):
+        loop = asyncio.get_event_loop()
+        complete = False
+        try:
+            self._file = await loop.run_in_executor(self.executor, self._open_file)
+            async with await open_upstream() as upstream:
+                self.response.set_result(upstream)
+                async for chunk in upstream.content.iter_chunked(self.chunk_size):
+                    await loop.run_in_executor(self.executor, self._file.write, chunk)
+                    await loop.run_in_executor(self.executor, self._file.flush)
+                    self.size += len(chunk)
+                    async with self._changed:
+                        self._changed.notify_all()
+            complete = True
+            if self.store is not None:
+                await loop.run_in_executor(self.executor, self._store)
+        except Exception as e:
+            self.error = e
+        finally:
+            if not complete and self.error is None:
+                self.error = ConnectionAbortedError("the download was cancelled")
+            if not complete and self.store is not None and self._file is not None:
+                # Not awaited, the download may have been cancelled.
+                loop.run_in_executor(self.executor, self._discard)
+            self._finish()
+            async with self._changed:
+                self._changed.notify_all()
+
+    def _finish(self):
+        if not self.response.done():
+            self.response.set_exception(self.error)
+        self.done = True
+        self._close_if_unused()
+
+    def _on_task_done(self, task):
+        # The task may have been cancelled before it even started.
+        if not self.done:
+            self.error = ConnectionAbortedError("the download was cancelled")
+            self._finish()
+
+    def _close_if_unused(self):
+        if self.done and not self.readers and self._file is not None:
+            self._file.close()
+
+    async def read(self):
+        """Yield the content, waiting for more to arrive until the download is done.
+
+        Raises the upstream error if the download failed.
+        """
+        loop = asyncio.get_event_loop()
+        offset = 0
+        while True:
+            if offset < self.size:
+                chunk = await loop.run_in_executor(
+                    self.executor,
+                    os.pread,
+                    self._file.fileno(),
+                    min(self.chunk_size, self.size - offset),
+                    offset,
+                )
+                offset += len(chunk)
+                yield chunk
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: self.size > offset or self.done
+                    )
+
+    def leave(self):
+        """Stop reading from the download"""
+        self.readers -= 1
+        self._close_if_unused()
+
+
+class SharedDownloads:
+    """Downloads in progress, by URL.
+
+    A request for a URL which is already being downloaded joins the download in
+    progress instead of starting another one. If store is given, each download
+    is spooled to a file in directory, and ``store(url, path)`` is called with
+    its path once it's complete, see SharedDownload.
+    """
+
+    def __init__(self, chunk_size, executor=None, directory=None, store=None):
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.directory = directory
+        self.store = store
+        self._downloads = {}
+
+    def join(self, url, open_upstream):
+        """Return the download of url, starting it if needed.
+
+        ``await open_upstream()`` must return the upstream aiohttp response. The
+        caller must call leave() on the download when it's done reading.
+        """
+        download = self._downloads.get(url)
+        if download is None or download.done:
+            store = None if self.store is None else functools.partial(self.store, url)
+            download = SharedDownload(
+                open_upstream, self.chunk_size, self.executor, self.directory, store
+            )
+            self._downloads[url] = download
+            download.task.add_done_callback(lambda _: self._remove(url, download))
+        download.readers += 1
+        return download
+
+    def _remove(self, url, download):
+        if self._downloads.get(url) is download:
+            del self._downloads[url]
+
+    async def close(self):
+        """Cancel the downloads in progress"""
+        tasks = [download.task for download in self._downloads.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover
+    uvloop = None
+
+JSON_ENCODERS = ("json", "orjson")
+
+
+def json_dumps(obj):
+    """Return obj encoded to JSON bytes, with the standard library"""
+    return json.dumps(obj).encode()
+
+
+def get_dumps(encoder):
+    """Return the function encoding objects to JSON bytes with the encoder.
+
+    encoder is one of JSON_ENCODERS. If orjson isn't installed, the standard
+    library is used instead.
+    """
+    if encoder == "orjson":
+        if orjson is not None:
+            return orjson.dumps
+        print("orjson isn't installed, using json instead")
+    return json_dumps
+
+
+def install_uvloop():
+    """Run the event loops on uvloop, if it's installed. Return whether it is"""
+    if uvloop is None:
+        print("uvloop isn't installed, using the default event loop instead")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
@@ -0,0 +1,174 @@
+import asyncio
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+
+class MemoryState:
+    """State kept in the memory of this process.
+
+    Values are JSON-serializable, and expire after the ttl they were set with.
+    At most max_size keys are kept, the least recently set are evicted first.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        # Expiry time and value, by key, least recently set first.
+        self._values = collections.OrderedDict()
+
+    def _get(self, key, now):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._values[key]
+            return None
+        return value
+
+    async def get(self, key):
+        """Return the value of the key, None if it isn't set"""
+        return self._get(key, time.time())
+
+    async def set(self, key, value, ttl):
+        """Set the value of the key, for ttl seconds"""
+        self._values.pop(key, None)
+        self._values[key] = (time.time() + ttl, value)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    async def add(self, key, value, ttl):
+        """Set the value of the key, unless it's already set. Return whether it was"""
+        if self._get(key, time.time()) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def append(self, key, value, ttl):
+        """Append value to the list at the key, setting it for ttl seconds"""
+        values = self._get(key, time.time()) or []
+        await self.set(key, values + [value], ttl)
+
+    async def delete(self, key):
+        """Unset the key"""
+        self._values.pop(key, None)
+
+    async def count(self, prefix):
+        """Return the number of keys set starting with prefix"""
+        now = time.time()
+        return sum(
+            1
+            for key, (expires_at, _) in self._values.items()
+            if key.startswith(prefix) and expires_at > now
+        )
+
+    def close(self):
+        pass
+
+
+class SQLiteState:
+    """State kept in a SQLite database, shared by the processes which open it.
+
+    Same interface as MemoryState. add() and append() are atomic across
+    processes, so only one of them sets the key, and no append is lost. The
+    database is accessed on executor, the loop's default executor if None.
+    """
+
+    def __init__(self, path, executor=None):
+        self.executor = executor
+        self._lock = threading.Lock()
+        # Wait for the other processes' writes to the database to finish.
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        with self.db:
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)"
+            )
+
+    def _run(self, query, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, query, *args)
+
+    def _get(self, key):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT value FROM state WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _set(self, key, value, ttl, replace=True):
+        now = time.time()
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+            cursor = self.db.execute(
+                f"{verb} INTO state VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl),
+            )
+        return cursor.rowcount == 1
+
+    def _append(self, key, value, ttl):
+        now = time.time()
+        with self._lock, self.db:
+            # Lock the database before reading, so the other processes wait.
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute(
+                "SELECT value FROM state WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            values = [] if row is None else json.loads(row[0])
+            values.append(value)
+            self.db.execute(
+                "INSERT OR REPLACE INTO state VALUES (?, ?, ?)",
+                (key, json.dumps(values), now + ttl),
+            )
+
+    def _delete(self, key):
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def _count(self, prefix):
+        with self._lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM state WHERE substr(key, 1, ?) = ? "
+                "AND expires_at > ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchone()[0]
+
+    async def get(self, key):
+        """Return the value of the key, None if it isn't set"""
+        return await self._run(self._get, key)
+
+    async def set(self, key, value, ttl):
+        """Set the value of the key, for ttl seconds"""
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key, value, ttl):
+        """Set the value of the key, unless it's already set. Return whether it was"""
+        return await self._run(self._set, key, value, ttl, False)
+
+    async def append(self, key, value, ttl):
+        """Append value to the list at the key, setting it for ttl seconds"""
+        await self._run(self._append, key, value, ttl)
+
+    async def delete(self, key):
+        """Unset the key"""
+        await self._run(self._delete, key)
+
+    async def count(self, prefix):
+        """Return the number of keys set starting with prefix"""
+        return await self._run(self._count, prefix)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,69 @@
+import asyncio
+
+
+class DeliveryInProgress(Exception):
+    """The delivery is still being handled by another process"""
+
+
+class WebhookResponses:
+    """Responses to the webhook deliveries, by delivery key, kept for ttl seconds.
+
+    Nexmo delivers a webhook again when it times out waiting for the response.
+    A redelivery gets the response to the first delivery, instead of being
+    handled again. A redelivery arriving while the first delivery is still
+    being handled waits for it, up to wait seconds.
+
+    Responses are JSON-serializable, and kept in the state backend, see
+    webservice.state, so redeliveries are recognized by every process sharing
+    it. A delivery is handled by one process at a time: the others only take
+    over if it fails, or if the process handling it stops for lease seconds.
+    """
+
+    def __init__(self, state, ttl, wait=10.0, poll_interval=0.05, lease=60.0):
+        self.state = state
+        self.ttl = ttl
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.lease = lease
+        # Deliveries being handled by this process.
+        self._handling = {}
+
+    async def get(self, key, handle):
+        """Return the response to the delivery key.
+
+        On the first delivery, ``await handle()`` computes it. If it fails, the
+        next delivery is handled again. Raise DeliveryInProgress if another
+        process is still handling it after waiting, the delivery should be
+        retried later.
+        """
+        if key in self._handling:
+            return await asyncio.shield(self._handling[key])
+
+        response = asyncio.ensure_future(self._get(key, handle))
+        self._handling[key] = response
+        response.add_done_callback(lambda _: self._handling.pop(key, None))
+        # The delivery is handled even if Nexmo hangs up.
+        return await asyncio.shield(response)
+
+    async def _get(self, key, handle):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.wait
+        while True:
+            response = await self.state.get(f"response:{key}")
+            if response is not None:
+                return response
+            if await self.state.add(f"handling:{key}", True, self.lease):
+                break
+            # Another process is handling it, wait for its response.
+            if loop.time() >= deadline:
+                raise DeliveryInProgress(f"{key} is being handled by another process")
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            response = await handle()
+        except BaseException:
+            await self.state.delete(f"handling:{key}")
+            raise
+        await self.state.set(f"response:{key}", response, self.ttl)
+        await self.state.delete(f"handling:{key}")
+        return response
@@ -0,0 +1,129 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from aiohttp import web
+
+# Set by the supervisor in the environment of the workers.
+SOCKET_FD_VAR = "WEBSERVICE_SOCKET_FD"
+WORKER_ID_VAR = "WEBSERVICE_WORKER_ID"
+
+
+def listen(port, host="0.0.0.0", backlog=128):
+    """Return a socket listening on port, to share between the workers"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def is_worker():
+    """Return whether this process is a worker started by the supervisor"""
+    return SOCKET_FD_VAR in os.environ
+
+
+def run_worker(app):
+    """Serve the app on the socket shared by the supervisor, until stopped"""
+    sock = socket.socket(fileno=int(os.environ[SOCKET_FD_VAR]))
+    app["worker_id"] = int(os.environ[WORKER_ID_VAR])
+
+    async def started(app):
+        # A single write, not to mix with the lines of the other workers.
+        sys.stdout.write(f"worker {app['worker_id']} started, pid {os.getpid()}\n")
+        sys.stdout.flush()
+
+    app.on_startup.append(started)
+    web.run_app(app, sock=sock)
+
+
+class Supervisor:
+    """Runs the webservice in worker processes, all accepting on the same socket.
+
+    A worker is restarted if it exits, unless it exits within min_uptime
+    seconds of starting, e.g. because of invalid settings. run() returns once
+    no worker is left.
+
+    SIGHUP reloads the webservice gracefully: new workers are started, running
+    the code as it is now, and the old workers are stopped. They finish
+    handling the requests in progress, while the new ones accept the new
+    connections. The workers get the environment of the supervisor, so changed
+    environment variables need a restart, while changes to PHONE_NUMBERS_FILE
+    are picked up anyway. SIGTERM and SIGINT stop the workers gracefully.
+    """
+
+    def __init__(self, sock, workers, min_uptime=5.0, poll_interval=0.5):
+        self.sock = sock
+        self.workers = workers
+        self.min_uptime = min_uptime
+        self.poll_interval = poll_interval
+        # Worker process and start time, by worker ID.
+        self._running = {}
+        # Workers being stopped.
+        self._stopping = []
+        self._reload = False
+        self._stop = False
+
+    def spawn(self, worker_id):
+        """Start the worker"""
+        fd = self.sock.fileno()
+        env = dict(
+            os.environ, **{SOCKET_FD_VAR: str(fd), WORKER_ID_VAR: str(worker_id)}
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "webservice"], env=env, pass_fds=(fd,)
+        )
+        self._running[worker_id] = (process, time.monotonic())
+
+    def _retire(self, process):
+        process.terminate()
+        self._stopping.append(process)
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        self._stop = True
+
+    def run(self):
+        """Start the workers, and supervise them until they are stopped.
+
+        Return the exit status: 0 if the workers were stopped, 1 if they failed.
+        """
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+
+        while self._running:
+            if self._stop:
+                for process, _ in self._running.values():
+                    self._retire(process)
+                self._running.clear()
+                break
+
+            if self._reload:
+                self._reload = False
+                print(f"reloading {self.workers} workers")
+                for worker_id, (process, _) in list(self._running.items()):
+                    self._retire(process)
+                    self.spawn(worker_id)
+
+            for worker_id, (process, started_at) in list(self._running.items()):
+                if process.poll() is None:
+                    continue
+                del self._running[worker_id]
+                print(f"worker {worker_id} exited with status {process.returncode}")
+                if time.monotonic() - started_at >= self.min_uptime:
+                    self.spawn(worker_id)
+
+            self._stopping = [p for p in self._stopping if p.poll() is None]
+            time.sleep(self.poll_interval)
+
+        for process in self._stopping:
+            process.wait()
+        return 0 if self._stop else 1